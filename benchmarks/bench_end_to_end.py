@@ -0,0 +1,154 @@
+"""
+End-to-end throughput of the pipeline against a local fake Canvas.
+
+Each scenario runs the real entry point in a fresh child process and working
+folder, pointed at a benchmarks.fake_canvas server (API_URL) serving
+synthetic courses. For each number of students it reports wall time, the
+requests the server answered and the child's peak RSS (including the
+orchestrator's worker processes). No Canvas instance or token is needed.
+
+Scenarios:
+    module-progress   RUN_MODULE_PROGRESS.main for one course
+    course-details    RUN_COURSE_DETAILS.do_it_all(assume_yes=True) for one
+                      course, with synthetic New Analytics and Gradebook exports
+    all-courses       orchestrator.run_all_courses over --courses courses
+
+--warm runs each scenario a second time in the same folder, so the HTTP
+response cache, incremental sync and stage cache of the first run are used.
+
+Usage:
+    python -m benchmarks.bench_end_to_end --students 100 1000 10000
+    python -m benchmarks.bench_end_to_end --scenario module-progress --workers 8 --bulk --latency-ms 50
+    python -m benchmarks.bench_end_to_end --scenario all-courses --courses 4 --processes 2 --students 500
+"""
+
+import argparse
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fake_canvas import FakeCanvas
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SCENARIOS = ["module-progress", "course-details", "all-courses"]
+RESULT_PREFIX = "BENCH_RESULT "
+
+
+def run_scenario(scenario, students, args, folder, server):
+    """Runs one scenario in a child process and returns its measurements"""
+    env = dict(os.environ, API_URL=server.url, API_TOKEN="fake-token", COURSE_ID=str(args.course_ids[0]),
+               PYTHONPATH=os.pathsep.join([str(REPO_ROOT), os.environ.get("PYTHONPATH", "")]))
+    env["HTTP_CACHE"] = str(args.http_cache)
+    command = [sys.executable, "-m", "benchmarks.bench_end_to_end", "--child", scenario,
+               "--processes", str(args.processes)]
+    if args.workers is not None:
+        command += ["--workers", str(args.workers)]
+    if args.bulk:
+        command.append("--bulk")
+
+    server.reset_counts()
+    with open(folder / f"{scenario}.log", "a") as log:
+        completed = subprocess.run(command, cwd=folder, env=env, stdout=subprocess.PIPE, stderr=log, text=True)
+        log.write(completed.stdout)
+    results = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if completed.returncode != 0 or not results:
+        raise RuntimeError(f"{scenario} with {students} students failed, see {folder / scenario}.log")
+    result = json.loads(results[-1][len(RESULT_PREFIX):])
+    counts = server.request_counts()
+    return dict(result, scenario=scenario, students=students, requests=counts.pop("total"), endpoints=counts)
+
+
+def prepare_folder(folder, course_ids, server):
+    """Writes course_entitlements.csv and the user exports the course details steps read"""
+    with open(folder / "course_entitlements.csv", "w", newline="") as f:
+        csv.writer(f).writerows([["course_id"]] + [[cid] for cid in course_ids])
+
+    course = server.courses[course_ids[0]]
+    user_input = folder / "data" / str(course.id) / "user_input"
+    _write_csv(user_input / "new_analytics_input" / "new_analytics.csv", course.new_analytics_rows())
+    detail, students = course.gradebook_rows()
+    _write_csv(user_input / "gradebook_input" / "gradebook.csv", detail + students)
+
+
+def _write_csv(path, rows):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def child(scenario, workers, bulk, processes):
+    """Runs a scenario in this process and prints its wall time and peak RSS"""
+    start = time.perf_counter()
+    if scenario == "module-progress":
+        from src.RUN_MODULE_PROGRESS import main
+        main(max_workers=workers, bulk=bulk)
+    elif scenario == "course-details":
+        from src.RUN_COURSE_DETAILS import do_it_all
+        do_it_all(assume_yes=True)
+    else:
+        from src.orchestrator import run_all_courses
+        run_all_courses(processes=processes, max_workers=workers, bulk=bulk)
+    seconds = time.perf_counter() - start
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS, KiB elsewhere
+    peak_mb = peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    print(RESULT_PREFIX + json.dumps({"seconds": round(seconds, 3), "peak_rss_mb": round(peak_mb, 1)}))
+
+
+def main(args):
+    args.course_ids = list(range(101, 101 + (args.courses if "all-courses" in args.scenario else 1)))
+    results = []
+    print(f"{'scenario':>16} {'students':>9} {'run':>5} {'seconds':>9} {'requests':>9} {'peak MiB':>9}")
+    for students in args.students:
+        for scenario in args.scenario:
+            with FakeCanvas(courses=args.course_ids, latency=args.latency_ms / 1000, last_link=not args.no_last_link,
+                            students=students, modules=args.modules, items=args.items,
+                            assignments=args.assignments) as server, \
+                    tempfile.TemporaryDirectory(prefix="bench_e2e_") as tmp:
+                folder = Path(args.keep) / f"{scenario}-{students}" if args.keep else Path(tmp)
+                folder.mkdir(parents=True, exist_ok=True)
+                prepare_folder(folder, args.course_ids, server)
+                for run in ["cold", "warm"] if args.warm else ["cold"]:
+                    result = dict(run_scenario(scenario, students, args, folder, server), run=run)
+                    results.append(result)
+                    print(f"{scenario:>16} {students:>9} {run:>5} {result['seconds']:>9.2f} "
+                          f"{result['requests']:>9} {result['peak_rss_mb']:>9.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", nargs="+", choices=SCENARIOS, default=["module-progress", "course-details"])
+    parser.add_argument("--students", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--modules", type=int, default=8)
+    parser.add_argument("--items", type=int, default=10, help="items per module")
+    parser.add_argument("--assignments", type=int, default=10)
+    parser.add_argument("--courses", type=int, default=3, help="courses for the all-courses scenario")
+    parser.add_argument("--latency-ms", type=float, default=10, help="added to every fake Canvas response")
+    parser.add_argument("--no-last-link", action="store_true",
+                        help="leave the numbered last page out of Link headers, so pages are followed one by one")
+    parser.add_argument("--workers", type=int, default=None, help="students fetched concurrently (Module Progress)")
+    parser.add_argument("--bulk", action="store_true", help="use the course-wide progress summary")
+    parser.add_argument("--processes", type=int, default=2, help="courses run at the same time (all-courses)")
+    parser.add_argument("--http-cache", action="store_true", help="enable the HTTP response cache (HTTP_CACHE)")
+    parser.add_argument("--warm", action="store_true", help="run every scenario a second time in the same folder")
+    parser.add_argument("--keep", default=None, help="run in this folder instead of a temporary one")
+    parser.add_argument("--json", default=None, help="also write the results to this JSON file")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.workers, args.bulk or None, args.processes)
+    else:
+        main(args)
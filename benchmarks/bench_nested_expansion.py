@@ -0,0 +1,73 @@
+"""
+Before/after measurement for expanding module items into student item rows.
+
+Runs the expansion done by canvas_helpers.get_student_items_status
+(_list_to_df on "items", then _dict_to_cols on the items and on their
+completion requirements) with the old row-wise helpers and with the current
+ones in data_utils, on a synthetic module status table. No Canvas requests
+are made.
+
+Usage:
+    python -m benchmarks.bench_nested_expansion 500 2000
+"""
+
+import re
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from src.canvas_helpers import _build_student_module_status
+from src.data_utils import _all_dict_to_str, _dict_to_cols, _list_to_df
+from benchmarks.synthetic import make_module_records, make_students
+
+
+def _dict_to_cols_rowwise(dataframe, col_to_expand, expand_name):
+    """Previous implementation, kept here as the baseline"""
+    dataframe[col_to_expand] = dataframe[col_to_expand].apply(_all_dict_to_str)
+    original_df = dataframe.drop([col_to_expand], axis=1)
+    extended_df = dataframe[col_to_expand].apply(pd.Series, dtype='object')
+    extended_df.columns = [i if bool(re.search(expand_name, i)) else "{}{}".format(str(expand_name), str(i)) for i in extended_df.columns]
+    new_df = pd.concat([original_df, extended_df], axis=1, ignore_index=False)
+    return new_df
+
+
+def _list_to_df_rowwise(dataframe, col_to_expand):
+    """Previous implementation, kept here as the baseline"""
+    series = dataframe.apply(lambda x: pd.Series(x[col_to_expand]), axis=1).stack().reset_index(level=1, drop=True)
+    series.name = col_to_expand
+    new_df = dataframe.drop(col_to_expand, axis=1).join(series)
+    return new_df
+
+
+def _expand(module_status, list_to_df, dict_to_cols):
+    expanded_items = list_to_df(module_status, "items")
+    expanded_items = dict_to_cols(expanded_items, "items", "items_")
+    return dict_to_cols(expanded_items, "items_completion_requirement", "item_cp_req_").reset_index(drop=True)
+
+
+def _measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def main(sizes):
+    print(f"{'students':>10} {'item rows':>10} {'impl':>10} {'seconds':>10} {'peak MiB':>10}")
+    for n_students in sizes:
+        module_status = _build_student_module_status(make_students(n_students), make_module_records(n_students))
+        before, t_before, m_before = _measure(
+            _expand, module_status.copy(), _list_to_df_rowwise, _dict_to_cols_rowwise)
+        after, t_after, m_after = _measure(_expand, module_status.copy(), _list_to_df, _dict_to_cols)
+        pd.testing.assert_frame_equal(before, after)
+        print(f"{n_students:>10} {len(after):>10} {'row-wise':>10} {t_before:>10.2f} {m_before:>10.1f}")
+        print(f"{n_students:>10} {len(after):>10} {'columnar':>10} {t_after:>10.2f} {m_after:>10.1f}")
+
+
+if __name__ == "__main__":
+    main([int(i) for i in sys.argv[1:]] or [500, 2000])
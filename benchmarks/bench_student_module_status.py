@@ -0,0 +1,58 @@
+"""
+Before/after measurement for building the student module status table.
+
+Compares the old accumulation (one DataFrame per student, concatenated onto a
+growing frame) with canvas_helpers._build_student_module_status on synthetic
+module records. No Canvas requests are made.
+
+Usage:
+    python -m benchmarks.bench_student_module_status 5000 20000
+"""
+
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from src.canvas_helpers import _build_student_module_status
+from benchmarks.synthetic import make_module_records, make_students
+
+
+def _concat_accumulate(students, all_student_records):
+    """Previous implementation, kept here as the baseline"""
+    student_module_status = pd.DataFrame()
+    for row, records in zip(students, all_student_records):
+        student_rows = pd.DataFrame(records)
+        student_rows["student_id"] = str(row["id"])
+        student_rows["sis_user_id"] = row["sis_user_id"]
+        student_rows["student_name"] = row["name"]
+        student_rows["sortable_student_name"] = row["sortable_name"]
+        student_module_status = pd.concat([student_module_status, student_rows], ignore_index=True, sort=False)
+    return student_module_status
+
+
+def _measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def main(sizes):
+    print(f"{'students':>10} {'impl':>8} {'seconds':>10} {'peak MiB':>10}")
+    for n_students in sizes:
+        students = make_students(n_students)
+        records = make_module_records(n_students)
+        before, t_before, m_before = _measure(_concat_accumulate, students, records)
+        after, t_after, m_after = _measure(_build_student_module_status, students, records)
+        pd.testing.assert_frame_equal(before, after)
+        print(f"{n_students:>10} {'concat':>8} {t_before:>10.2f} {m_before:>10.1f}")
+        print(f"{n_students:>10} {'batch':>8} {t_after:>10.2f} {m_after:>10.1f}")
+
+
+if __name__ == "__main__":
+    main([int(i) for i in sys.argv[1:]] or [5000, 20000])
@@ -0,0 +1,212 @@
+"""
+Time and memory of the pandas transforms, checked against stored baselines.
+
+Each case runs one function on benchmarks.synthetic data at several sizes
+(number of students). The inputs are rebuilt before every run and are not
+measured. Time is the best of --repeat runs, memory is the peak traced by
+tracemalloc during one more run. Everything runs offline, in a temporary
+working folder (the Tableau steps write their CSVs there).
+
+Results are compared with benchmarks/baselines.json. A case regresses when
+it is more than --time-threshold times slower (and at least --min-seconds
+slower) or takes more than --memory-threshold times the memory (and at
+least --min-mb more) than its baseline; the script then exits with status 1.
+Baselines depend on the machine: regenerate them with --update-baselines
+after an intended change or when moving to another machine.
+
+Usage:
+    python -m benchmarks.bench_suite
+    python -m benchmarks.bench_suite --case get_student_items_status --sizes 1000 10000
+    python -m benchmarks.bench_suite --update-baselines
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+os.environ.setdefault("COURSE_ID", "benchmark")
+
+import pandas as pd
+
+from src import settings
+from src.canvas_helpers import get_student_items_status
+from src.custom_steps.transform_course_data_for_tableau import (
+    clean_submissions_data, combine_course_structure, combine_enrollment_and_new_analytics_new)
+from src.custom_steps.transform_course_details_data import clean_columns_from_rename_dict
+from src.data_utils import _dict_to_cols, _list_to_df
+from src.file_utils import create_folder
+from src.pipeline_context import PipelineContext
+from benchmarks import synthetic
+
+BASELINES_FILE = Path(__file__).resolve().parent / "baselines.json"
+DEFAULT_SIZES = [100, 1000, 5000]
+
+
+def _context_with(datasets, names):
+    """Returns a PipelineContext holding the cleaned_data datasets in names"""
+    context = PipelineContext(memory_limit_mb=float("inf"))
+    for name in names:
+        context.write(datasets[name], settings.CLEANEDDATA_FOLDER, name)
+    return context
+
+
+def _setup_list_to_df(n_students):
+    return synthetic.student_module_status(n_students), "items"
+
+
+def _setup_dict_to_cols(n_students):
+    return _list_to_df(synthetic.student_module_status(n_students), "items"), "items", "items_"
+
+
+def _setup_items_status(n_students):
+    return SimpleNamespace(id=1, name="Benchmark Course"), synthetic.student_module_status(n_students)
+
+
+def _setup_clean_columns(n_students):
+    rename_dict = synthetic.detail_dicts()["new_analytics_new"]["rename_dict"]
+    return synthetic.raw_datasets(n_students)["new_analytics_new"], dict(rename_dict), True
+
+
+def _setup_course_structure(n_students):
+    # the course structure does not depend on students, scale the modules instead
+    datasets = synthetic.cleaned_datasets(1, n_modules=max(1, n_students // 10))
+    return datasets["module_items"], datasets["modules"], _context_with(datasets, [])
+
+
+def _setup_student_analytics(n_students):
+    datasets = synthetic.cleaned_datasets(n_students)
+    return (_context_with(datasets, ["enrollments", "new_analytics_new"]),)
+
+
+def _setup_submissions(n_students):
+    datasets = synthetic.cleaned_datasets(n_students)
+    return (_context_with(datasets, ["assignments", "assignment_submissions"]),)
+
+
+# name -> (setup(n_students) returning the arguments, function measured)
+CASES = {
+    "_list_to_df": (_setup_list_to_df, _list_to_df),
+    "_dict_to_cols": (_setup_dict_to_cols, _dict_to_cols),
+    "get_student_items_status": (_setup_items_status, get_student_items_status),
+    "clean_columns_from_rename_dict": (_setup_clean_columns, clean_columns_from_rename_dict),
+    "combine_course_structure": (_setup_course_structure, combine_course_structure),
+    "combine_enrollment_and_new_analytics_new": (_setup_student_analytics, combine_enrollment_and_new_analytics_new),
+    "clean_submissions_data": (_setup_submissions, clean_submissions_data),
+}
+
+
+def measure(case, n_students, repeat=3):
+    """Returns {"seconds": best of repeat runs, "peak_mb": tracemalloc peak of one run}"""
+    setup, func = CASES[case]
+    times = []
+    for _ in range(repeat):
+        args = setup(n_students)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func(*args)
+            times.append(time.perf_counter() - start)
+
+    args = setup(n_students)
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(min(times), 5), "peak_mb": round(peak / 2**20, 3)}
+
+
+def compare(result, baseline, args):
+    """Returns the regressions of result against baseline, as a list of messages"""
+    if baseline is None:
+        return []
+    regressions = []
+    if (result["seconds"] > baseline["seconds"] * args.time_threshold
+            and result["seconds"] - baseline["seconds"] > args.min_seconds):
+        regressions.append(f"time {result['seconds']:.4f}s vs {baseline['seconds']:.4f}s")
+    if (result["peak_mb"] > baseline["peak_mb"] * args.memory_threshold
+            and result["peak_mb"] - baseline["peak_mb"] > args.min_mb):
+        regressions.append(f"memory {result['peak_mb']:.1f} MiB vs {baseline['peak_mb']:.1f} MiB")
+    return regressions
+
+
+def load_baselines(path):
+    if not Path(path).exists():
+        return {"results": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(path, baselines, results):
+    for case, sizes in results.items():
+        baselines["results"].setdefault(case, {}).update(sizes)
+    baselines["machine"] = {"python": platform.python_version(), "pandas": pd.__version__,
+                            "platform": platform.platform(), "processor": platform.processor()}
+    with open(path, "w") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def _run_cases(args, baselines, results):
+    """Measures every case and size, prints them and returns the number that regressed"""
+    failures = 0
+    for case in args.case:
+        for n_students in args.sizes:
+            result = measure(case, n_students, args.repeat)
+            results.setdefault(case, {})[str(n_students)] = result
+            baseline = baselines["results"].get(case, {}).get(str(n_students))
+            regressions = compare(result, baseline, args)
+            failures += bool(regressions)
+            status = "new" if baseline is None else "; ".join(regressions) or "ok"
+            base_s, base_mb = (f"{baseline['seconds']:.4f}", f"{baseline['peak_mb']:.1f}") if baseline else ("-", "-")
+            print(f"{case:>42} {n_students:>9} {result['seconds']:>9.4f} {base_s:>9} "
+                  f"{result['peak_mb']:>9.1f} {base_mb:>9}  {status}")
+    return failures
+
+
+def main(args):
+    baselines = load_baselines(args.baselines)
+    results = {}
+    print(f"{'case':>42} {'students':>9} {'seconds':>9} {'base s':>9} {'peak MiB':>9} {'base MiB':>9}  status")
+    # the Tableau steps write to relative folders, keep them out of the repo
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bench_suite_") as folder:
+        os.chdir(folder)
+        try:
+            create_folder(settings.TABLEAU_FOLDER)
+            failures = _run_cases(args, baselines, results)
+        finally:
+            os.chdir(cwd)
+
+    if args.update_baselines:
+        save_baselines(args.baselines, baselines, results)
+        print(f"Baselines written to {args.baselines}")
+        return 0
+    if failures:
+        print(f"{failures} regression(s) beyond the thresholds")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--case", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of students")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case, the best is kept")
+    parser.add_argument("--baselines", default=str(BASELINES_FILE))
+    parser.add_argument("--update-baselines", action="store_true", help="store these results as the baselines")
+    parser.add_argument("--time-threshold", type=float, default=1.5, help="slowdown ratio counted as a regression")
+    parser.add_argument("--memory-threshold", type=float, default=1.25, help="memory ratio counted as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.01, help="ignore slowdowns smaller than this")
+    parser.add_argument("--min-mb", type=float, default=1.0, help="ignore memory increases smaller than this")
+    sys.exit(main(parser.parse_args()))
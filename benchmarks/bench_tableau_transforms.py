@@ -0,0 +1,122 @@
+"""
+Before/after measurement for the column expressions in
+transform_course_data_for_tableau: item_order, percent_score and the
+file-type filter applied to New Analytics rows.
+
+The old row-wise versions are kept here as the baseline and every result is
+checked against them. The file-type filter is compared on names without a
+4 letter image extension only: the old regex never matched those (a .jpeg
+was kept as if it had no extension), the current one drops them.
+
+Usage:
+    python -m benchmarks.bench_tableau_transforms 100000 1000000
+"""
+
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.custom_steps.transform_course_data_for_tableau import IMAGE_TYPES, _extract_file_types
+
+CONTENT_NAMES = np.array(
+    ["notes.pdf", "data.csv", "photo.jpeg", "Week 1 Overview", "slides.pptx",
+     "bundle.zip", "diagram.png", "readme.txt", "index.html", None], dtype=object)
+
+
+def _extract_file_type_rowwise(somestring):
+    """Previous implementation, kept here as the baseline"""
+    try:
+        match_str = re.compile("(.*)(\\.)([a-zA-Z]{3}$)")
+        match = re.match(match_str, somestring)
+        if match:
+            return(match.group(3))
+    except:
+        return(None)
+    else:
+        return(None)
+
+
+def item_order_rowwise(modules_and_items):
+    return modules_and_items.apply(lambda x: x['module_position']
+                                   + x['module_item_position']/100, axis=1)
+
+
+def item_order_columnar(modules_and_items):
+    return modules_and_items['module_position'] + modules_and_items['module_item_position']/100
+
+
+def percent_score_rowwise(submissions_df):
+    return submissions_df.apply(lambda x: x['assignment_score']/x['assignment_points_possible']
+                                if x['assignment_points_possible'] > 0 else None, axis=1)
+
+
+def percent_score_columnar(submissions_df):
+    points_possible = submissions_df['assignment_points_possible']
+    return submissions_df['assignment_score'] / points_possible.where(points_possible > 0)
+
+
+def filter_files_rowwise(student_analytics):
+    keepfiles = [None, "csv", "zip", "txt", "pdf"]
+    student_analytics = student_analytics.copy()
+    student_analytics['filetype'] = student_analytics["content_name"].apply(lambda x: _extract_file_type_rowwise(x))
+    return student_analytics.query("`filetype` == @keepfiles")
+
+
+def filter_files_columnar(student_analytics):
+    student_analytics = student_analytics.copy()
+    student_analytics['filetype'] = _extract_file_types(student_analytics["content_name"])
+    return student_analytics[~student_analytics['filetype'].str.lower().isin(IMAGE_TYPES)]
+
+
+def make_data(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    modules_and_items = pd.DataFrame({
+        "module_position": rng.integers(1, 30, n_rows),
+        "module_item_position": rng.integers(1, 60, n_rows),
+    })
+    submissions = pd.DataFrame({
+        "assignment_score": rng.uniform(0, 10, n_rows),
+        "assignment_points_possible": rng.choice([0.0, 5.0, 10.0, np.nan], n_rows),
+    })
+    analytics = pd.DataFrame({
+        "user_id": rng.integers(0, 5000, n_rows),
+        "content_name": rng.choice(CONTENT_NAMES, n_rows),
+    })
+    return modules_and_items, submissions, analytics
+
+
+def _time(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(sizes):
+    print(f"{'rows':>10} {'transform':>14} {'row-wise':>10} {'columnar':>10}")
+    for n_rows in sizes:
+        modules_and_items, submissions, analytics = make_data(n_rows)
+
+        before, t_before = _time(item_order_rowwise, modules_and_items)
+        after, t_after = _time(item_order_columnar, modules_and_items)
+        pd.testing.assert_series_equal(before, after, check_dtype=False, check_names=False)
+        print(f"{n_rows:>10} {'item_order':>14} {t_before:>10.2f} {t_after:>10.2f}")
+
+        before, t_before = _time(percent_score_rowwise, submissions)
+        after, t_after = _time(percent_score_columnar, submissions)
+        pd.testing.assert_series_equal(before.astype(float), after, check_names=False)
+        print(f"{n_rows:>10} {'percent_score':>14} {t_before:>10.2f} {t_after:>10.2f}")
+
+        before, t_before = _time(filter_files_rowwise, analytics)
+        after, t_after = _time(filter_files_columnar, analytics)
+        compared = ~analytics["content_name"].str.contains(r"\.(?:jpeg|webp)$", case=False, na=False)
+        pd.testing.assert_index_equal(before.index.intersection(compared[compared].index),
+                                      after.index.intersection(compared[compared].index))
+        print(f"{n_rows:>10} {'file filter':>14} {t_before:>10.2f} {t_after:>10.2f}"
+              f"   ({len(before) - len(after)} rows with 4 letter image extensions now filtered)")
+
+
+if __name__ == "__main__":
+    main([int(i) for i in sys.argv[1:]] or [100000, 1000000])
@@ -0,0 +1,428 @@
+"""
+Local stand-in for the Canvas REST API, serving synthetic courses.
+
+Answers the requests the pipeline makes (users/self, courses, users,
+enrollments, assignments, students/submissions, modules with embedded items
+or per student, module items, bulk_user_progress) with deterministic data
+generated from the course id, so runs are repeatable without a Canvas
+instance or token. Responses are paginated like Canvas (page/per_page and a
+Link header, with or without a "last" link), carry an ETag and answer
+If-None-Match with a 304, and can be slowed down by a fixed latency.
+
+Every request is counted per endpoint, so benchmarks can report how many
+requests a run needed.
+
+Usage:
+    with FakeCanvas(students=1000, latency=0.02) as canvas:
+        os.environ["API_URL"] = canvas.url
+        ...
+        print(canvas.request_counts())
+
+    python -m benchmarks.fake_canvas --students 100 --port 8900   # serve until interrupted
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from functools import cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+# timestamps of the synthetic data; submissions changed after SUBMISSIONS_CHANGED_AT don't exist
+COURSE_START = 1704067200  # 2024-01-01T00:00:00Z
+SUBMISSIONS_CHANGED_AT = "2024-06-01T00:00:00Z"
+CONTENT_NAMES = ["syllabus.pdf", "week {}.pdf", "data {}.csv", "photo {}.jpeg", "Week {} Overview",
+                 "slides {}.pptx", "readings {}.zip", "notes {}.txt"]
+
+
+def _timestamp(seconds):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(COURSE_START + seconds))
+
+
+class FakeCourse:
+    """Synthetic course, every object derived from its id and sizes
+
+    Lists that don't depend on the request (students, enrollments,
+    assignments, bulk progress) are built once and reused for every page.
+
+    Args:
+        course_id (int)
+        students (int)
+        modules (int)
+        items (int): items per module
+        assignments (int): every student has a submission for each
+        completion (float): share of module items a student has completed,
+            every fifth student has completed none
+    """
+
+    def __init__(self, course_id, students=100, modules=8, items=10, assignments=10, completion=0.6):
+        # ids are built by appending these counts to the parent's id
+        if students >= 100000 or modules >= 1000 or items >= 100 or assignments >= 100:
+            raise ValueError("FakeCourse supports up to 99999 students, 999 modules, 99 items and 99 assignments")
+        self.id = course_id
+        self.n_students = students
+        self.n_modules = modules
+        self.n_items = items
+        self.n_assignments = assignments
+        self.completion = completion
+        self.student_ids = [course_id * 100000 + i for i in range(students)]
+        self.teacher_id = course_id * 100000 - 1
+
+    def course(self):
+        return {"id": self.id, "name": f"Synthetic Course {self.id}", "course_code": f"SYN {self.id}",
+                "workflow_state": "available", "start_at": _timestamp(0)}
+
+    def user(self, user_id):
+        i = user_id - self.id * 100000
+        return {"id": user_id, "name": f"Student {i}", "sortable_name": f"{i}, Student",
+                "short_name": f"Student {i}", "sis_user_id": f"{10000000 + i}", "integration_id": None,
+                "login_id": f"student{i}", "pronouns": None, "created_at": _timestamp(i % 86400),
+                "email": f"student{i}@example.com"}
+
+    @cache
+    def students(self):
+        return [self.user(user_id) for user_id in self.student_ids]
+
+    @cache
+    def enrollments(self, student_only=False):
+        users = [(self.teacher_id, "TeacherEnrollment")] if not student_only else []
+        users += [(user_id, "StudentEnrollment") for user_id in self.student_ids]
+        enrollments = []
+        for user_id, role in users:
+            score = (user_id * 37) % 1000 / 10
+            enrollments.append({
+                "id": user_id + 7, "user_id": user_id, "course_id": self.id, "type": role, "role": role,
+                "course_section_id": self.id * 10, "enrollment_state": "active",
+                "created_at": _timestamp(user_id % 86400),
+                "user": {"id": user_id, "name": f"User {user_id}", "sortable_name": f"{user_id}, User"},
+                "grades": {"current_score": score, "final_score": score * 0.9,
+                           "html_url": f"/courses/{self.id}/grades/{user_id}"},
+            })
+        return enrollments
+
+    @cache
+    def assignments(self):
+        return [{
+            "id": self.id * 1000 + a, "name": f"Assignment {a}", "description": f"<p>Assignment {a}</p>",
+            "due_at": _timestamp(86400 * 7 * (a + 1)), "points_possible": 0.0 if a % 5 == 4 else 10.0,
+            "submission_types": ["online_upload"], "workflow_state": "published",
+            "is_quiz_assignment": a % 3 == 0, "published": True, "course_id": self.id,
+        } for a in range(self.n_assignments)]
+
+    def submission_count(self):
+        return self.n_students * self.n_assignments
+
+    def submissions(self, start, stop):
+        """Submissions start..stop of the course, ordered by student then assignment"""
+        submissions = []
+        for i in range(start, min(stop, self.submission_count())):
+            student, a = divmod(i, self.n_assignments)
+            user_id = self.student_ids[student]
+            submitted = (user_id + a) % 7 != 0
+            submissions.append({
+                "id": user_id * 100 + a, "user_id": user_id, "assignment_id": self.id * 1000 + a,
+                "course_id": self.id, "score": float((user_id + a) % 11) if submitted else None,
+                "submitted_at": _timestamp(86400 * 7 * (a + 1) - 3600) if submitted else None,
+                "graded_at": _timestamp(86400 * 7 * (a + 1) + 3600) if submitted else None,
+                "submission_type": "online_upload" if submitted else None,
+                "workflow_state": "graded" if submitted else "unsubmitted", "attempt": 1 if submitted else None,
+                "seconds_late": 0, "late": False, "missing": not submitted,
+            })
+        return submissions
+
+    def modules(self, student_id=None, include_items=False):
+        modules = []
+        for m in range(self.n_modules):
+            module_id = self.id * 1000 + m
+            items = self.module_items(module_id, student_id)
+            module = {
+                "id": module_id, "name": f"Module {m}", "position": m + 1, "unlock_at": None,
+                "require_sequential_progress": False, "publish_final_grade": False,
+                "prerequisite_module_ids": [], "published": True, "items_count": len(items),
+                "items_url": f"/api/v1/courses/{self.id}/modules/{module_id}/items",
+            }
+            if student_id is not None:
+                required = [i["completion_requirement"] for i in items if i.get("completion_requirement")]
+                done = sum(r["completed"] for r in required)
+                module["state"] = "completed" if done == len(required) else "started" if done else "unlocked"
+                module["completed_at"] = _timestamp(86400 * (m + 1)) if module["state"] == "completed" else None
+            if include_items:
+                module["items"] = items
+            modules.append(module)
+        return modules
+
+    def module_items(self, module_id, student_id=None):
+        m = module_id - self.id * 1000
+        items = []
+        for k in range(self.n_items):
+            item_id = module_id * 100 + k
+            item = {
+                "id": item_id, "title": f"Item {m}.{k}", "position": k + 1, "indent": k % 2,
+                "type": "Page" if k % 3 else "File", "module_id": module_id,
+                "html_url": f"/courses/{self.id}/modules/items/{item_id}",
+                "page_url": f"item-{item_id}", "url": f"/api/v1/courses/{self.id}/pages/item-{item_id}",
+                "published": True, "content_id": item_id,
+            }
+            if k % 4 != 3:
+                requirement = {"type": "must_view"}
+                if student_id is not None:
+                    requirement["completed"] = self._completed(student_id, item_id)
+                item["completion_requirement"] = requirement
+            items.append(item)
+        return items
+
+    @cache
+    def bulk_user_progress(self):
+        required = sum(1 for k in range(self.n_items) if k % 4 != 3) * self.n_modules
+        progress = []
+        for user_id in self.student_ids:
+            done = sum(
+                self._completed(user_id, (self.id * 1000 + m) * 100 + k)
+                for m in range(self.n_modules) for k in range(self.n_items) if k % 4 != 3
+            )
+            progress.append({
+                "user": {"id": user_id, "name": f"Student {user_id}"},
+                "progress": {"requirement_count": required, "requirement_completed_count": done,
+                             "next_requirement_url": None,
+                             "completed_at": _timestamp(86400 * 30) if done == required else None},
+            })
+        return progress
+
+    def _completed(self, student_id, item_id):
+        if student_id % 5 == 0:
+            return False
+        return (student_id * 31 + item_id * 17) % 100 < self.completion * 100
+
+    def new_analytics_rows(self, rows_per_student=20):
+        """Rows for a synthetic New Analytics export of this course"""
+        rows = []
+        for user_id in self.student_ids:
+            for r in range(rows_per_student):
+                day = (user_id + r) % 90
+                rows.append({
+                    "Student Id": user_id, "Course Id": self.id, "Student Name": f"Student {user_id}",
+                    "Content Type": "file" if r % 2 else "page",
+                    "Content Name": CONTENT_NAMES[r % len(CONTENT_NAMES)].format(r),
+                    "Times Viewed": (user_id + r) % 9, "Times Participated": r % 3,
+                    "Start Date": time.strftime("%Y-%m-%d", time.gmtime(COURSE_START + 86400 * day)),
+                    "Last Viewed": _timestamp(86400 * day + 7200), "First Viewed": _timestamp(86400 * day),
+                })
+        return rows
+
+    def gradebook_rows(self):
+        """Header detail rows and student rows of a synthetic Gradebook export"""
+        detail = [{"Student": "    Points Possible", "ID": None, "Current Score": None, "Final Score": None},
+                  {"Student": "    Muted", "ID": None, "Current Score": None, "Final Score": None}]
+        students = [{"Student": f"{user_id}, Student", "ID": user_id, "Current Score": (user_id * 37) % 1000 / 10,
+                     "Final Score": (user_id * 37) % 1000 / 11} for user_id in self.student_ids]
+        return detail, students
+
+
+class FakeCanvas:
+    """Threaded HTTP server answering Canvas API requests for FakeCourse objects
+
+    Args:
+        courses (list of int): course ids served
+        latency (float): seconds added to every response
+        per_page (int): page size when the request doesn't set per_page (Canvas uses 10)
+        max_per_page (int): largest page size honoured (Canvas uses 100)
+        last_link (bool): include a numbered "last" link, Canvas leaves it out
+            for some endpoints
+        embed_items_limit (int): modules with more items than this are
+            returned without them when items are included, as Canvas does
+            for large modules
+        port (int): 0 picks a free port
+        **course_sizes: passed to FakeCourse (students, modules, items, ...)
+    """
+
+    ROUTES = [
+        ("users/self", re.compile(r"^users/self$")),
+        ("course", re.compile(r"^courses/(\d+)$")),
+        ("users", re.compile(r"^courses/(\d+)/(?:search_)?users$")),
+        ("enrollments", re.compile(r"^courses/(\d+)/enrollments$")),
+        ("assignments", re.compile(r"^courses/(\d+)/assignments$")),
+        ("submissions", re.compile(r"^courses/(\d+)/students/submissions$")),
+        ("modules", re.compile(r"^courses/(\d+)/modules$")),
+        ("module_items", re.compile(r"^courses/(\d+)/modules/(\d+)/items$")),
+        ("bulk_user_progress", re.compile(r"^courses/(\d+)/bulk_user_progress$")),
+    ]
+
+    def __init__(self, courses=(1,), latency=0.0, per_page=10, max_per_page=100, last_link=True,
+                 embed_items_limit=None, port=0, **course_sizes):
+        self.courses = {cid: FakeCourse(cid, **course_sizes) for cid in courses}
+        self.latency = latency
+        self.per_page = per_page
+        self.max_per_page = max_per_page
+        self.last_link = last_link
+        self.embed_items_limit = embed_items_limit
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def request_counts(self):
+        """Returns requests answered so far per endpoint, with the overall count under "total" """
+        with self._lock:
+            counts = dict(self._counts)
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def reset_counts(self):
+        with self._lock:
+            self._counts.clear()
+
+    def handle(self, path, query, headers):
+        """Returns (status, body bytes, extra headers) for a GET request"""
+        endpoint, args = self._route(path)
+        with self._lock:
+            self._counts[endpoint or "not_found"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if not headers.get("Authorization", "").startswith("Bearer "):
+            return 401, json.dumps({"errors": [{"message": "Invalid access token."}]}).encode(), {}
+        if endpoint is None or (args and int(args[0]) not in self.courses):
+            return 404, json.dumps({"errors": [{"message": "The specified resource does not exist."}]}).encode(), {}
+
+        course = self.courses[int(args[0])] if args else None
+        links = {}
+        if endpoint == "users/self":
+            data = {"id": 1, "name": "Fake Canvas Admin"}
+        elif endpoint == "course":
+            data = course.course()
+        elif endpoint == "bulk_user_progress":
+            data, links = self._page(path, query, course.bulk_user_progress())
+        elif endpoint == "submissions":
+            since = max(query.get("submitted_since", [""])[0], query.get("graded_since", [""])[0])
+            count = course.submission_count() if since < SUBMISSIONS_CHANGED_AT else 0
+            data, links = self._page(path, query, count=count, slice_=course.submissions)
+        else:
+            data, links = self._page(path, query, self._list(endpoint, course, args, query))
+
+        body = json.dumps(data).encode()
+        etag = f'W/"{hashlib.md5(body).hexdigest()}"'
+        extra = {"ETag": etag}
+        if links:
+            extra["Link"] = ",".join(f'<{url}>; rel="{rel}"' for rel, url in links.items())
+        if headers.get("If-None-Match") == etag:
+            return 304, b"", extra
+        return 200, body, extra
+
+    def _route(self, path):
+        path = path[len("/api/v1/"):] if path.startswith("/api/v1/") else None
+        for endpoint, pattern in self.ROUTES if path is not None else []:
+            match = pattern.match(path)
+            if match:
+                return endpoint, match.groups()
+        return None, ()
+
+    def _list(self, endpoint, course, args, query):
+        include = query.get("include[]", [])
+        if endpoint == "users":
+            return course.students()
+        if endpoint == "enrollments":
+            return course.enrollments(student_only="student" in query.get("enrollment_type[]", []))
+        if endpoint == "assignments":
+            return course.assignments()
+        if endpoint == "modules":
+            student_id = query.get("student_id", [None])[0]
+            modules = course.modules(int(student_id) if student_id else None, include_items="items" in include)
+            if self.embed_items_limit is not None:
+                for module in modules:
+                    if len(module.get("items", [])) > self.embed_items_limit:
+                        del module["items"]
+            return modules
+        if endpoint == "module_items":
+            student_id = query.get("student_id", [None])[0]
+            return course.module_items(int(args[1]), int(student_id) if student_id else None)
+        raise ValueError(endpoint)
+
+    def _page(self, path, query, elements=None, count=None, slice_=None):
+        """Returns one page of elements (or of slice_(start, stop) for count elements) and its Link URLs"""
+        # repeated parameters: the last one wins, as in Rails
+        per_page = min(int(query.get("per_page", [self.per_page])[-1]), self.max_per_page)
+        page = int(query.get("page", [1])[-1])
+        if count is None:
+            count = len(elements)
+        start = (page - 1) * per_page
+        data = elements[start:start + per_page] if slice_ is None else slice_(start, min(start + per_page, count))
+        last = max(1, -(-count // per_page))
+
+        def page_url(number):
+            params = [(k, v) for k, values in query.items() if k not in ("page", "per_page") for v in values]
+            params += [("page", number), ("per_page", per_page)]
+            return f"{self.url}{path}?{urlencode(params)}"
+
+        links = {"current": page_url(page), "first": page_url(1)}
+        if page < last:
+            links["next"] = page_url(page + 1)
+        if self.last_link:
+            links["last"] = page_url(last)
+        return data, links
+
+
+def _handler(fake_canvas):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            status, body, headers = fake_canvas.handle(
+                parts.path, parse_qs(parts.query, keep_blank_values=True), self.headers)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses", type=int, nargs="+", default=[1])
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--modules", type=int, default=8)
+    parser.add_argument("--items", type=int, default=10)
+    parser.add_argument("--assignments", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+    server = FakeCanvas(courses=args.courses, latency=args.latency_ms / 1000, port=args.port,
+                        students=args.students, modules=args.modules, items=args.items,
+                        assignments=args.assignments)
+    print(f"Fake Canvas serving courses {args.courses} at {server.url}, API_URL={server.url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
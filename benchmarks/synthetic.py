@@ -0,0 +1,187 @@
+"""
+Synthetic data for the offline benchmarks, scaled by number of students.
+
+- make_students / make_module_records: the input get_student_module_status
+  builds its table from (student rows and per-student module records)
+- student_module_status: that table, as get_student_module_status returns it
+- raw_datasets: original_data datasets as create_course_data and
+  check_for_user_input_files write them (Canvas attribute names)
+- cleaned_datasets: the same after transform_course_data (renamed columns)
+
+Everything is generated from a seed, so the same arguments give the same data.
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.canvas_helpers import _build_student_module_status
+from src.custom_steps import special_course_details
+from src.custom_steps.transform_course_details_data import clean_columns_from_rename_dict
+from src.data_utils import normalize_datetimes
+
+N_MODULES = 8
+N_ITEMS = 10
+CONTENT_NAMES = np.array(
+    ["notes.pdf", "data.csv", "photo.jpeg", "Week 1 Overview", "slides.pptx",
+     "bundle.zip", "diagram.png", "readme.txt", "index.html", None], dtype=object)
+
+
+def make_students(n_students):
+    return [
+        pd.Series({"id": 1000 + i, "sis_user_id": f"{10000000 + i}",
+                   "name": f"Student {i}", "sortable_name": f"{i}, Student"})
+        for i in range(n_students)
+    ]
+
+
+def make_module_records(n_students, n_modules=N_MODULES, n_items=N_ITEMS):
+    items = [
+        {"id": k, "title": f"Item {k}", "position": k, "indent": 0, "type": "Page",
+         "completion_requirement": {"type": "must_view", "completed": k % 2 == 0}}
+        for k in range(n_items)
+    ]
+    return [
+        [
+            {"id": m, "name": f"Module {m}", "position": m, "unlock_at": None,
+             "require_sequential_progress": False, "publish_final_grade": False,
+             "prerequisite_module_ids": [], "state": "started", "completed_at": None,
+             "items_count": n_items, "items_url": "", "items": items, "course_id": 1}
+            for m in range(n_modules)
+        ]
+        for _ in range(n_students)
+    ]
+
+
+def student_module_status(n_students, n_modules=N_MODULES, n_items=N_ITEMS, seed=0):
+    """Returns the student module status table get_student_module_status builds
+
+    Unlike make_module_records, progress varies by student: each item is
+    completed with probability 0.6 and modules are completed, started or
+    unlocked accordingly.
+    """
+    rng = np.random.default_rng(seed)
+    completed = rng.random((n_students, n_modules, n_items)) < 0.6
+    records = []
+    for s in range(n_students):
+        student_records = []
+        for m in range(n_modules):
+            module_id = 100 + m
+            items = [
+                {"id": module_id * 100 + k, "title": f"Item {m}.{k}", "position": k + 1, "indent": k % 2,
+                 "type": "Page" if k % 3 else "File", "module_id": module_id,
+                 "html_url": f"/courses/1/modules/items/{module_id * 100 + k}",
+                 "completion_requirement": {"type": "must_view", "completed": bool(completed[s, m, k])}}
+                for k in range(n_items)
+            ]
+            done = completed[s, m].sum()
+            state = "completed" if done == n_items else "started" if done else "unlocked"
+            student_records.append({
+                "id": module_id, "name": f"Module {m}", "position": m + 1, "unlock_at": None,
+                "require_sequential_progress": False, "publish_final_grade": False,
+                "prerequisite_module_ids": [], "state": state,
+                "completed_at": f"2024-02-{1 + m % 28:02d}T10:00:00Z" if state == "completed" else None,
+                "items_count": n_items, "items_url": "", "items": items, "course_id": 1,
+            })
+        records.append(student_records)
+
+    status = _build_student_module_status(make_students(n_students), records)
+    normalize_datetimes(status, ["completed_at", "unlock_at"])
+    return status.rename(columns={"id": "module_id", "name": "module_name", "position": "module_position"})
+
+
+def raw_datasets(n_students, n_assignments=10, n_modules=N_MODULES, n_items=N_ITEMS, analytics_rows=20, seed=0):
+    """Returns {dataset name: DataFrame} of original_data as the download and user input steps write it"""
+    rng = np.random.default_rng(seed)
+    user_ids = np.arange(1000, 1000 + n_students)
+    enrollments = pd.DataFrame({
+        "id": user_ids + 7, "user_id": user_ids, "course_id": 1, "type": "StudentEnrollment",
+        "course_section_id": 5, "role": "StudentEnrollment", "enrollment_state": "active",
+        "user_name": [f"Student {u}" for u in user_ids],
+        "grades_current_score": rng.uniform(0, 100, n_students).round(1),
+        "grades_final_score": rng.uniform(0, 100, n_students).round(1),
+        "created_at": pd.Timestamp("2024-01-01", tz="UTC"),
+    })
+    enrollments.loc[0, ["type", "role"]] = "TeacherEnrollment"
+
+    assignments = pd.DataFrame({
+        "id": np.arange(n_assignments), "description": "<p>Assignment</p>",
+        "due_at": pd.date_range("2024-01-08", periods=n_assignments, freq="7D", tz="UTC"),
+        "points_possible": np.where(np.arange(n_assignments) % 5 == 4, 0.0, 10.0),
+        "name": [f"Assignment {a}" for a in range(n_assignments)],
+        "submission_types": [["online_upload"]] * n_assignments, "workflow_state": "published",
+        "is_quiz_assignment": np.arange(n_assignments) % 3 == 0, "published": True, "course_id": 1,
+    })
+
+    n_submissions = n_students * n_assignments
+    submission_user = np.repeat(user_ids, n_assignments)
+    submission_assignment = np.tile(np.arange(n_assignments), n_students)
+    submitted = rng.random(n_submissions) < 0.85
+    submissions = pd.DataFrame({
+        "id": submission_user * 100 + submission_assignment, "user_id": submission_user,
+        "assignment_id": submission_assignment, "course_id": 1,
+        "score": np.where(submitted, rng.integers(0, 11, n_submissions), np.nan),
+        "submitted_at": pd.Series(pd.Timestamp("2024-02-01", tz="UTC"), index=range(n_submissions)).where(submitted),
+        "submission_type": np.where(submitted, "online_upload", None),
+        "workflow_state": np.where(submitted, "graded", "unsubmitted"),
+        "attempt": np.where(submitted, 1.0, np.nan), "seconds_late": 0,
+    })
+
+    modules = pd.DataFrame({
+        "id": 100 + np.arange(n_modules), "name": [f"Module {m}" for m in range(n_modules)],
+        "position": np.arange(1, n_modules + 1), "published": True, "course_id": 1,
+    })
+    module_ids = np.repeat(100 + np.arange(n_modules), n_items)
+    item_positions = np.tile(np.arange(1, n_items + 1), n_modules)
+    item_ids = module_ids * 100 + item_positions
+    module_items = pd.DataFrame({
+        "id": item_ids, "title": [f"Item {i}" for i in item_ids], "position": item_positions,
+        "type": np.where(item_positions % 3 == 0, "File", "Page"), "module_id": module_ids,
+        "html_url": [f"/courses/1/modules/items/{i}" for i in item_ids], "page_url": "page",
+        "url": "url", "published": True, "course_id": 1, "content_id": item_ids,
+    })
+
+    n_rows = n_students * analytics_rows
+    days = pd.date_range("2024-01-01", periods=90).strftime("%Y-%m-%d").to_numpy()
+    new_analytics = pd.DataFrame({
+        "Student Id": pd.array(rng.choice(user_ids, n_rows), dtype="Int64"),
+        "Course Id": pd.array(np.ones(n_rows, dtype=int), dtype="Int64"),
+        "Student Name": pd.array(["Student"] * n_rows, dtype="string"),
+        "Content Type": pd.array(rng.choice(["file", "page"], n_rows), dtype="string"),
+        "Content Name": pd.array(rng.choice(CONTENT_NAMES, n_rows), dtype="string"),
+        "Times Viewed": pd.array(rng.integers(0, 20, n_rows), dtype="Int64"),
+        "Times Participated": pd.array(rng.integers(0, 3, n_rows), dtype="Int64"),
+        "Start Date": pd.array(rng.choice(days, n_rows), dtype="string"),
+        "Last Viewed": pd.array(["2024-01-05T10:00:00Z"] * n_rows, dtype="string"),
+        "First Viewed": pd.array(["2024-01-01T10:00:00Z"] * n_rows, dtype="string"),
+        "file": pd.array(["new_analytics.csv"] * n_rows, dtype="string"),
+    })
+
+    gradebook = pd.DataFrame({
+        "Student": [f"{u}, Student" for u in user_ids], "ID": user_ids,
+        "Current Score": enrollments["grades_current_score"], "Final Score": enrollments["grades_final_score"],
+    })
+
+    return {
+        "enrollments": enrollments, "assignments": assignments, "assignment_submissions": submissions,
+        "modules": modules, "module_items": module_items, "new_analytics_new": new_analytics,
+        "gradebook_user_data": gradebook,
+    }
+
+
+def detail_dicts():
+    """Returns {dataset name: detail dict} for the datasets transform_course_data cleans"""
+    return {d["name"]: d for d in [
+        special_course_details.ASSIGNMENTS_DICT, special_course_details.MODULEITEMS_DICT,
+        special_course_details.MODULES_DICT, special_course_details.ASSIGNMENTSUBMISSIONS_DICT,
+        special_course_details.ENROLLMENTS_DICT, special_course_details.NEWANALYTICS_NEW_DICT,
+        special_course_details.GRADEBOOKUSERDATA_DICT,
+    ]}
+
+
+def cleaned_datasets(n_students, **kwargs):
+    """Returns {dataset name: DataFrame} of cleaned_data, as transform_course_data writes it"""
+    details = detail_dicts()
+    return {
+        name: clean_columns_from_rename_dict(normalize_datetimes(df), dict(details[name]["rename_dict"]), True)
+        for name, df in raw_datasets(n_students, **kwargs).items()
+    }
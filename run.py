@@ -1,9 +1,143 @@
-from src.RUN_COURSE_DETAILS import do_it_all as run_course_details
-from src.RUN_MODULE_PROGRESS import main as run_module_progress
+"""
+Command line for the course details and Module Progress scripts.
+
+    python3 -m run                    course details, then Module Progress
+    python3 -m run fetch              download the course data from Canvas
+    python3 -m run transform          add the New Analytics / Gradebook exports and clean every dataset
+    python3 -m run tableau            write the course details Tableau tables
+    python3 -m run module-progress    Module Progress (--all-courses for every course in course_entitlements.csv)
+    python3 -m run status             how the last runs went, without contacting Canvas
+
+Commands import pandas, canvasapi and the pipeline only when they run, and
+settings are read from .env on first use, so --help and status start fast.
+"""
+
+import argparse
+
+import src.settings as settings
+from src import profiling
+
+# option name -> (flags, argparse keyword arguments)
+OPTIONS = {
+    "workers": (["--workers"], dict(
+        type=int, default=None,
+        help="students fetched concurrently for Module Progress (default: MODULE_PROGRESS_WORKERS or 1)")),
+    "bulk": (["--bulk"], dict(
+        action="store_true", default=None,
+        help="skip the requests of students with no completed requirements (from Canvas' course-wide "
+             "progress summary), everyone else is still requested one by one")),
+    "all_courses": (["--all-courses"], dict(
+        action="store_true", default=False,
+        help="run Module Progress for every course in course_entitlements.csv")),
+    "processes": (["--processes"], dict(
+        type=int, default=None,
+        help="courses run at the same time with --all-courses (default: ORCHESTRATOR_PROCESSES or 4)")),
+    "no_cache": (["--no-cache"], dict(
+        action="store_true", default=False,
+        help="bypass the on-disk Canvas response cache")),
+    "full_refresh": (["--full-refresh"], dict(
+        action="store_true", default=False,
+        help="download every submission instead of only those changed since the last run")),
+    "yes": (["--yes"], dict(
+        action="store_true", default=False,
+        help="don't ask for the New Analytics and Gradebook exports, use what is in their folders")),
+    "force": (["--force"], dict(
+        action="store_true", default=False,
+        help="rerun every course details stage, even those whose inputs are unchanged")),
+    "compact": (["--compact"], dict(
+        action="store_true", default=False,
+        help="use compact dtypes for the Module Progress tables and report the memory saved")),
+}
+
+# command -> (help, options it takes)
+COMMANDS = {
+    "fetch": ("download the course data from Canvas", ["no_cache", "full_refresh", "force"]),
+    "transform": ("add the New Analytics and Gradebook exports and clean every dataset", ["force"]),
+    "tableau": ("write the course details Tableau tables", ["force"]),
+    "module-progress": ("get Module Progress from Canvas",
+                        ["workers", "bulk", "all_courses", "processes", "no_cache", "compact"]),
+    "status": ("show how the last runs went", []),
+}
+
+
+def main(workers=None, bulk=None, all_courses=False, processes=None, assume_yes=False):
+    """Runs the course details steps, then Module Progress"""
+    from src.RUN_COURSE_DETAILS import do_it_all as run_course_details
+
+    run_course_details(assume_yes=assume_yes)
+    module_progress(workers=workers, bulk=bulk, all_courses=all_courses, processes=processes)
+
+
+def module_progress(workers=None, bulk=None, all_courses=False, processes=None):
+    if all_courses:
+        from src.orchestrator import run_all_courses
+        run_all_courses(processes=processes, max_workers=workers, bulk=bulk)
+    else:
+        from src.RUN_MODULE_PROGRESS import main as run_module_progress
+        run_module_progress(max_workers=workers, bulk=bulk)
+
+
+def run_command(args):
+    """Runs the command (main when none is given), then reports on the run"""
+    if args.command == "status":
+        from src.run_status import print_status
+        print_status()
+        return
+
+    with profiling.from_arguments(args, args.command or "run"):
+        if args.command is None:
+            main(workers=args.workers, bulk=args.bulk, all_courses=args.all_courses, processes=args.processes,
+                 assume_yes=args.yes)
+        elif args.command == "module-progress":
+            module_progress(workers=args.workers, bulk=args.bulk, all_courses=args.all_courses,
+                            processes=args.processes)
+        else:
+            import src.RUN_COURSE_DETAILS as course_details
+            {"fetch": course_details.fetch, "transform": course_details.transform,
+             "tableau": course_details.tableau}[args.command]()
+
+    from src.http_utils import print_connection_stats
+    from src.run_report import finish_run_report
+    print_connection_stats()
+    finish_run_report(settings.DATA_FOLDER)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Canvas course details and Module Progress data for Tableau")
+    _add_options(parser, OPTIONS)
+    profiling.add_arguments(parser)
+    commands = parser.add_subparsers(dest="command", metavar="command",
+                                     help="one step only (default: course details, then Module Progress)")
+    for name, (help_text, options) in COMMANDS.items():
+        command = commands.add_parser(name, help=help_text, description=help_text)
+        # given after the command; SUPPRESS keeps the value of an option given before it
+        _add_options(command, options, default=argparse.SUPPRESS)
+        if name != "status":
+            profiling.add_arguments(command, default=argparse.SUPPRESS)
+    return parser
+
+
+def _add_options(parser, names, default=None):
+    for name in names:
+        flags, kwargs = OPTIONS[name]
+        if default is not None:
+            kwargs = dict(kwargs, default=default)
+        parser.add_argument(*flags, **kwargs)
+
+
+def apply_settings(args):
+    """Applies the options that change settings"""
+    if args.no_cache:
+        settings.HTTP_CACHE_ENABLED = False
+    if args.full_refresh:
+        settings.FULL_REFRESH = True
+    if args.force:
+        settings.FORCE_RERUN = True
+    if args.compact:
+        settings.COMPACT_DTYPES = True
 
-def main():
-    run_course_details()
-    run_module_progress()
 
 if __name__ == "__main__":
-    main()
+    args = build_parser().parse_args()
+    apply_settings(args)
+    run_command(args)
@@ -1,22 +1,68 @@
 
+import argparse
+
 from src.custom_steps.check_for_user_inputs import check_for_user_input_files
 from src.custom_steps.get_course_details_data import create_course_data
 from src.interface import confirm_strict
+from src.http_utils import print_connection_stats
+from src.pipeline_context import PipelineContext
+from src import profiling
+from src.run_report import finish_run_report, measure
+from src.stage_cache import StageCache
 from src.utils import print_success
 import src.settings as settings
-from src.settings import COURSE_ID
 from src.custom_steps.transform_course_details_data import transform_course_data
 from src.custom_steps.transform_course_data_for_tableau import transform_course_data_for_tableau
 
-def do_it_all():
-    create_course_data()
-    confirm_strict(f"Please add any New Analytics downloads to {settings.NEWANALYTICS_NEW_FOLDER}. Confirm when complete enter [Y] or exit [N].")
-    confirm_strict(f"Please add your Gradebook export to {settings.GRADEBOOK_FOLDER}. Confirm when complete enter [Y] or exit [N].")
-    check_for_user_input_files()
-    transform_course_data()
-    transform_course_data_for_tableau()
+def new_context():
+    """Returns the PipelineContext of a course details run
+
+    Datasets are handed from stage to stage in memory and still written to
+    disk, stages whose inputs are unchanged since the last run are skipped.
+    """
+    return PipelineContext(stages=StageCache(settings.STAGE_MANIFEST_FILE, force=settings.FORCE_RERUN))
+
+def fetch(context=None):
+    """Downloads the course data from Canvas to original_data"""
+    with measure(settings.COURSE_ID, "course_details/download"):
+        create_course_data(context or new_context())
+
+def transform(context=None):
+    """Adds the New Analytics and Gradebook exports to original_data, then cleans every dataset into cleaned_data"""
+    context = context or new_context()
+    with measure(settings.COURSE_ID, "course_details/user_input"):
+        check_for_user_input_files(context)
+    with measure(settings.COURSE_ID, "course_details/transform"):
+        transform_course_data(context)
+
+def tableau(context=None):
+    """Writes the Tableau tables from cleaned_data"""
+    with measure(settings.COURSE_ID, "course_details/tableau"):
+        transform_course_data_for_tableau(context or new_context())
+
+def do_it_all(assume_yes=False):
+    """Downloads, transforms and formats the course details data for Tableau
+
+    Args:
+        assume_yes (bool): don't stop to ask for the New Analytics and Gradebook
+            exports, use whatever is in their folders already
+    """
+    context = new_context()
+    fetch(context)
+    if not assume_yes:
+        confirm_strict(f"Please add any New Analytics downloads to {settings.NEWANALYTICS_NEW_FOLDER}. Confirm when complete enter [Y] or exit [N].")
+        confirm_strict(f"Please add your Gradebook export to {settings.GRADEBOOK_FOLDER}. Confirm when complete enter [Y] or exit [N].")
+    transform(context)
+    tableau(context)
+    context.clear()
     print_success("Done!")
 
 if __name__ == "__main__":
     # execute only if run as a script
-    do_it_all()
+    parser = argparse.ArgumentParser()
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    with profiling.from_arguments(args, "course_details"):
+        do_it_all()
+    print_connection_stats()
+    finish_run_report(settings.DATA_FOLDER)
@@ -10,12 +10,9 @@ https://github.com/ucfopen/canvasapi
 
 """
 
+import argparse
 import sys
-print(sys.executable)
-
-
-import sys
-from canvasapi.exceptions import Unauthorized
+from canvasapi.exceptions import Forbidden, RateLimitExceeded, Unauthorized
 import pandas as pd
 import src.interface as interface
 import src.settings as settings
@@ -25,14 +22,27 @@ from src.canvas_helpers import (
 )
 from src.file_utils import (write_data_directory)
 from src.logging_utils import (log_success, log_failure)
+from src.http_utils import print_connection_stats
+from src import profiling
+from src.run_report import finish_run_report, measure, record_rows
 
 pd.set_option("display.max_columns", 500)
 
 
-def main():
+def main(max_workers=None, bulk=None):
     """
     Main entry point for Module Progress Script
+
+    Args:
+        max_workers (int): students fetched concurrently per course,
+            defaults to settings.MODULE_PROGRESS_WORKERS
+        bulk (bool): use the course-wide progress summary where possible,
+            defaults to settings.MODULE_PROGRESS_BULK
     """
+    if max_workers is None:
+        max_workers = settings.MODULE_PROGRESS_WORKERS
+    if bulk is None:
+        bulk = settings.MODULE_PROGRESS_BULK
 
     # Initialization
     usr_settings = interface.get_user_settings()
@@ -46,47 +56,92 @@ def main():
     # Prints error and skips course if unsuccessful
 
     for cid in course_ids:
-        course = canvas.get_course(cid)
-        # Calling helpers to get data from Canvas and build Pandas DataFrame's
-
-        try:
-            settings.status[str(cid)]["cname"] = course.name
-            #modules_df = get_modules(course)
-            #items_df = get_items(modules_df, course.name)
-            student_module_status = get_student_module_status(course)
+        student_items_status = run_course(canvas, cid, max_workers=max_workers, bulk=bulk)
+        if student_items_status is not None:
+            tableau_dfs.append(student_items_status)
+
+    interface.render_status_table()
+    print("\n\033[94m" + "***COMPLETED***" + "\033[91m")
+
+
+def run_course(canvas, cid, max_workers=1, bulk=False, exit_on_error=True):
+    """Gets module progress for one course and writes it to the data directory
+
+    Status for the course is logged in settings.status, including a course
+    that cannot be found or accessed.
+
+    Args:
+        canvas (canvasapi.Canvas)
+        cid (int or str): course id
+        max_workers (int): students fetched concurrently
+        bulk (bool): use the course-wide progress summary where possible
+        exit_on_error (bool): shut down on unexpected errors (otherwise the
+            course is logged as failed)
+
+    Returns:
+        DataFrame: student items status, or None if the course failed
+    """
+    with measure(cid, "module_progress/course"):
+        course = interface.get_course(canvas, cid, exit_on_error=exit_on_error)
+    if course is None:
+        return None
+    # Calling helpers to get data from Canvas and build Pandas DataFrame's
+
+    try:
+        settings.status[str(cid)]["cname"] = course.name
+        #modules_df = get_modules(course)
+        #items_df = get_items(modules_df, course.name)
+        with measure(cid, "module_progress/student_module_status"):
+            student_module_status = get_student_module_status(course, max_workers=max_workers, bulk=bulk)
+            record_rows(len(student_module_status))
+        with measure(cid, "module_progress/student_items_status"):
             student_items_status = get_student_items_status(
                 course, student_module_status
             )
-        except KeyError as error:
-            log_failure(cid, error)
-        except Unauthorized:
-            log_failure(
-                cid,
-                "User not authorized to get module progress data for course: "
-                + str(cid),
-            )
-        except IndexError:
-            log_failure(cid, "Course must have students enrolled")
-        except Exception as e:
-            log_failure(cid, "Unexpected error: " + e)
-            print(e)
+            record_rows(len(student_items_status))
+    except KeyError as error:
+        log_failure(cid, error)
+    except Unauthorized:
+        log_failure(
+            cid,
+            "User not authorized to get module progress data for course: "
+            + str(cid),
+        )
+    except IndexError:
+        log_failure(cid, "Course must have students enrolled")
+    except RateLimitExceeded as e:
+        log_failure(cid, "Canvas rate limit exceeded, retries exhausted: " + str(e))
+    except Exception as e:
+        if isinstance(e, Forbidden) and "Rate Limit Exceeded" in str(e):
+            # Canvas reports throttling as a 403
+            log_failure(cid, "Canvas rate limit exceeded, retries exhausted: " + str(e))
+            return None
+        log_failure(cid, "Unexpected error: " + str(e))
+        print(e)
+        if exit_on_error:
             print("Shutting down...")
             sys.exit()
-        else:
-            # Writing dataframes to disk
-            dataframes = {
-                #"module_df": modules_df,
-                #"items_df": items_df,
-                #"student_module_df": student_module_status,
-                "student_items_df": student_items_status,
-            }
-            tableau_dfs.append(student_items_status)
-            write_data_directory(dataframes, cid)
-            log_success(cid)
-
-    interface.render_status_table()
-    print("\n\033[94m" + "***COMPLETED***" + "\033[91m")
+    else:
+        # Writing dataframes to disk
+        dataframes = {
+            #"module_df": modules_df,
+            #"items_df": items_df,
+            #"student_module_df": student_module_status,
+            "student_items_df": student_items_status,
+        }
+        with measure(cid, "module_progress/write"):
+            dataframes = write_data_directory(dataframes, cid)
+            record_rows(sum(len(df) for df in dataframes.values()))
+        log_success(cid)
+        return dataframes["student_items_df"]
+    return None
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    with profiling.from_arguments(args, "module_progress"):
+        main()
+    print_connection_stats()
+    finish_run_report(settings.DATA_FOLDER)
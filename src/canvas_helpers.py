@@ -3,12 +3,19 @@ Canvas API Helpers: Fetching courses, modules, students, and module status.
 """
 
 from canvasapi import Canvas
+from canvasapi.canvas_object import CanvasObject
+from canvasapi.exceptions import CanvasException, ResourceDoesNotExist
+from canvasapi.paginated_list import PaginatedList
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
 
 from .utils import print_success, shut_down
-from .data_utils import create_dict_from_object, _list_to_df, _dict_to_cols, _clean_datetime_value
+from .http_utils import configure_canvas_session
+from .data_utils import create_dict_from_object, _list_to_df, _dict_to_cols, normalize_datetimes
+from . import profiling
 
 def get_modules(course):
     """Returns all modules from specified course"""
@@ -51,33 +58,58 @@ def get_items(modules_df, cname):
         return items_df
 
 
-def get_student_module_status(course):
-    """Returns DataFrame with students' module progress"""
+STUDENT_MODULE_ATTRS = [
+    "id", "name", "position", "unlock_at", "require_sequential_progress",
+    "publish_final_grade", "prerequisite_module_ids", "state",
+    "completed_at", "items_count", "items_url", "items", "course_id",
+]
+
+
+@profiling.stage("get_student_module_status")
+def get_student_module_status(course, max_workers=1, bulk=False):
+    """Returns DataFrame with students' module progress
+
+    Args:
+        course (canvasapi.course.Course): The course obj.
+        max_workers (int): number of students whose modules are requested
+            concurrently. 1 keeps the original sequential behaviour.
+        bulk (bool): build rows from the course-wide progress summary where
+            possible, requesting modules per student only for the rest.
+    """
     print("Getting Module Status for students ...")
     students_df = _get_students(course)
     enrollments_df = _get_enrollments(course)
 
     print("Getting student module info for " + course.name)
-    student_module_status = pd.DataFrame()
-
-    num_rows = len(list(students_df.iterrows()))
-    with tqdm(total=num_rows) as pbar:
-        for i, row in students_df.iterrows():
-            pbar.update(1)
-            sid = row["id"]
-            student_data = course.get_modules(student_id=sid, include=["items"], per_page=50)
-            attrs = [
-                "id", "name", "position", "unlock_at", "require_sequential_progress",
-                "publish_final_grade", "prerequisite_module_ids", "state",
-                "completed_at", "items_count", "items_url", "items", "course_id",
-            ]
-            student_rows_dict = [create_dict_from_object(m, attrs) for m in student_data]
-            student_rows = pd.DataFrame(student_rows_dict)
-            student_rows["student_id"] = str(sid)
-            student_rows["sis_user_id"] = row["sis_user_id"]
-            student_rows["student_name"] = row["name"]
-            student_rows["sortable_student_name"] = row["sortable_name"]
-            student_module_status = pd.concat([student_module_status, student_rows], ignore_index=True, sort=False)
+
+    students = [row for _, row in students_df.iterrows()]
+    bulk_records = _get_bulk_student_modules(course, students) if bulk else {}
+    all_student_records = [bulk_records.get(row["id"]) for row in students]
+    to_fetch = [i for i, records in enumerate(all_student_records) if records is None]
+    if bulk:
+        print(f"Bulk progress covered {len(students) - len(to_fetch)} of {len(students)} students")
+
+    with tqdm(total=len(students), initial=len(students) - len(to_fetch)) as pbar:
+        if max_workers and max_workers > 1:
+            # Keep several students in flight; results are collected back in
+            # student order so the output matches the sequential path.
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(_get_student_modules, course, students[i]): i for i in to_fetch}
+                try:
+                    for future in as_completed(futures):
+                        pbar.update(1)
+                        all_student_records[futures[future]] = future.result()
+                except BaseException:
+                    # drop the students still queued, only those in flight are waited for
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+        else:
+            for i in to_fetch:
+                pbar.update(1)
+                all_student_records[i] = _get_student_modules(course, students[i])
+
+    student_module_status = _build_student_module_status(students, all_student_records)
+    normalize_datetimes(student_module_status, ["completed_at", "unlock_at"])
 
     student_module_status = student_module_status.rename(
         columns={"id": "module_id", "name": "module_name", "position": "module_position"}
@@ -88,6 +120,159 @@ def get_student_module_status(course):
     return student_module_status_with_enrollment_date
 
 
+def _get_student_modules(course, row):
+    """Returns list of dicts, one per module (with items and progress) for a student"""
+    sid = row["id"]
+    student_data = course.get_modules(student_id=sid, include=["items"], per_page=50)
+    return [create_dict_from_object(m, STUDENT_MODULE_ATTRS) for m in student_data]
+
+
+def _get_bulk_student_modules(course, students):
+    """Returns module records for the students whose progress is known from bulk data
+
+    Canvas' bulk user progress only reports requirement counts per student,
+    not per-item state. The only students whose module rows can be derived
+    from it without a request of their own are those who have not completed
+    any requirement yet, and only when the course structure makes every
+    module "unlocked" for them (all items present, each module has
+    requirements, no prerequisites, no future unlock date). Everyone else is
+    left out so get_student_module_status requests their modules per student.
+
+    Their rows are copied from the instructor's view of the modules, so bulk
+    is refused when that view can differ from a student's: unpublished
+    modules or items, assignments visible only to students with overrides,
+    or modules assigned to some students only.
+
+    Costs one request per 100 users for the progress summary, one for the
+    modules, one for the assignments and one per module for its overrides;
+    saves one request per student without progress (see README).
+
+    Args:
+        course (canvasapi.course.Course): The course obj.
+        students (list of Series): student rows from _get_students
+
+    Returns:
+        dict: student id -> list of module records (same attrs as _get_student_modules)
+    """
+    try:
+        progress = _get_bulk_user_progress(course)
+        structure = list(course.get_modules(include=["items"], per_page=50))
+        module_records = [create_dict_from_object(m, STUDENT_MODULE_ATTRS) for m in structure]
+        if not module_records or not all(_is_unlocked_without_progress(m) for m in module_records):
+            print("Bulk progress incomplete for this course structure, requesting modules per student ...")
+            return {}
+        if (not all(_is_published(m) for m in structure) or _has_restricted_assignments(course)
+                or any(_has_module_overrides(course, m) for m in structure)):
+            print("Modules differ between students (unpublished or assigned to some students only), "
+                  "requesting modules per student ...")
+            return {}
+    except CanvasException as e:
+        print(f"Bulk progress unavailable ({e}), requesting modules per student ...")
+        return {}
+
+    bulk_records = {}
+    for row in students:
+        student_progress = progress.get(row["id"])
+        if not student_progress:
+            continue
+        if student_progress.get("requirement_completed_count") == 0 and not student_progress.get("completed_at"):
+            bulk_records[row["id"]] = [_not_started_module(m) for m in module_records]
+    return bulk_records
+
+
+def _get_bulk_user_progress(course):
+    """Returns dict of user id -> progress summary for every user in the course"""
+    user_progress = PaginatedList(
+        CanvasObject, course._requester, "GET",
+        f"courses/{course.id}/bulk_user_progress", per_page=100,
+    )
+    return {
+        p.user["id"]: p.progress
+        for p in user_progress
+        if isinstance(getattr(p, "user", None), dict) and isinstance(getattr(p, "progress", None), dict)
+    }
+
+
+def _is_published(module):
+    """True if the module and every one of its items are published (students don't see the others)"""
+    items = getattr(module, "items", None) or []
+    return getattr(module, "published", False) is True and all(item.get("published") is True for item in items)
+
+
+def _has_restricted_assignments(course):
+    """True if an assignment (or graded quiz or discussion) is visible only to students with an override"""
+    return any(getattr(a, "only_visible_to_overrides", False) for a in course.get_assignments(per_page=100))
+
+
+def _has_module_overrides(course, module):
+    """True if the module is assigned to some students or sections only ("Assign To")"""
+    overrides = PaginatedList(
+        CanvasObject, course._requester, "GET",
+        f"courses/{course.id}/modules/{module.id}/assignment_overrides", per_page=100,
+    )
+    try:
+        return any(True for _ in overrides)
+    except ResourceDoesNotExist:
+        # Canvas versions without module overrides
+        return False
+
+
+def _is_unlocked_without_progress(module):
+    """True if a student with no completed requirements would see the module unlocked"""
+    items = module["items"]
+    if items is None or len(items) != module["items_count"]:
+        return False
+    if not any(item.get("completion_requirement") for item in items):
+        return False
+    if module["prerequisite_module_ids"]:
+        return False
+    unlock_at = pd.to_datetime(module["unlock_at"], utc=True)
+    return pd.isnull(unlock_at) or unlock_at <= pd.Timestamp.now(tz="UTC")
+
+
+def _not_started_module(module):
+    """Returns a copy of a course module record as seen by a student with no progress"""
+    items = []
+    for item in module["items"]:
+        item = dict(item)
+        if item.get("completion_requirement"):
+            item["completion_requirement"] = dict(item["completion_requirement"], completed=False)
+        items.append(item)
+    return dict(module, state="unlocked", completed_at=None, items=items)
+
+
+def _build_student_module_status(students, all_student_records):
+    """Builds the student module status DataFrame in a single pass
+
+    Module records for every student are collected as plain dicts and turned
+    into one DataFrame at the end (instead of concatenating a growing frame
+    once per student). The per-student fields are then repeated in bulk.
+
+    Args:
+        students (list of Series): student rows from _get_students
+        all_student_records (list of list of dict): module records per student,
+            in the same order as students
+
+    Returns:
+        DataFrame: one row per student per module
+    """
+    counts = [len(records) for records in all_student_records]
+    records = [record for student_records in all_student_records for record in student_records]
+    student_module_status = pd.DataFrame(records)
+
+    student_fields = pd.DataFrame({
+        "student_id": [str(row["id"]) for row in students],
+        "sis_user_id": [row["sis_user_id"] for row in students],
+        "student_name": [row["name"] for row in students],
+        "sortable_student_name": [row["sortable_name"] for row in students],
+    })
+    student_fields = student_fields.take(np.repeat(np.arange(len(students)), counts))
+    for col in student_fields.columns:
+        student_module_status[col] = student_fields[col].to_numpy()
+    return student_module_status
+
+
+@profiling.stage("get_student_items_status")
 def get_student_items_status(course, module_status):
     """Returns expanded student module status data table"""
     try:
@@ -102,13 +287,9 @@ def get_student_items_status(course, module_status):
     student_items_status["course_id"] = course.id
     student_items_status["course_name"] = course.name
 
-    items_status_list = student_items_status["completed_at"].values.tolist()
-    cleaned = map(_clean_datetime_value, items_status_list)
-    student_items_status["completed_at"] = list(cleaned)
-
-    dates = student_items_status["completed_at"].unique()
+    max_date = student_items_status["completed_at"].max()
     print("Max Date:")
-    print(max([pd.to_datetime(i) for i in dates if i is not None]).strftime("%Y-%m-%d %H:%M:%S"))
+    print(max_date.strftime("%Y-%m-%d %H:%M:%S") if pd.notna(max_date) else "None")
 
     student_items_status = student_items_status[
         [
@@ -128,7 +309,7 @@ def create_canvas_object():
         url = os.getenv('API_URL')
         token = os.getenv('API_TOKEN')
         auth_header = {'Authorization': f'Bearer {token}'}
-        canvas = Canvas(url, token)
+        canvas = configure_canvas_session(Canvas(url, token))
         try:
             user = canvas.get_user('self')
             print_success(f'\nHello, {user.name}!')
@@ -174,7 +355,7 @@ def _get_students(course):
     ]
 
     students_data = [create_dict_from_object(s, attrs) for s in students]
-    students_df = pd.DataFrame(students_data)
+    students_df = normalize_datetimes(pd.DataFrame(students_data), ["created_at"])
     return students_df
 
 
@@ -204,6 +385,7 @@ def _get_enrollments(course):
     enrollment_data = [create_dict_from_object(e, attrs) for e in enrollments]
     enrollments_df = pd.DataFrame(enrollment_data)
     enrollments_df['user_id'] = enrollments_df['user_id'].astype(str)
+    normalize_datetimes(enrollments_df, ["created_at"])
     return enrollments_df
 
 def __clean_datetime_value(datetime_string):
@@ -1,9 +1,14 @@
 from ..utils import print_success, shut_down
 from ..file_utils import check_for_data
+from ..storage import DatasetWriter
+from ..pipeline_context import PipelineContext
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import glob
 import pandas as pd
-from ..settings import COURSE_ID
 from .. import settings
+from .. import profiling
+from . import special_course_details
 
 """ 
 Once data collected, this script will create a "project_folder"
@@ -11,7 +16,9 @@ and reorganize data as appropriate.
 """
         
 # create folder called project_data
-def check_for_user_input_files():
+@profiling.stage("check_for_user_input_files")
+def check_for_user_input_files(context=None):
+    context = context or PipelineContext(memory_limit_mb=0)
     
     if check_for_data(settings.DATA_FOLDER):
         print_success(f'DATA FOLDER FOUND {settings.DATA_FOLDER}\n')
@@ -23,15 +30,16 @@ def check_for_user_input_files():
 
             # MOVE TO USER_DATA
             #combined new_analytics_input
-            analytics_files = glob.glob(f"{settings.NEWANALYTICS_NEW_FOLDER}/*.csv")
-            li = []
-            for filename in analytics_files:
-                df = pd.read_csv(filename)
-                df['file'] = filename
-                li.append(df)
-
-            df = pd.concat(li, axis=0)
-            df.to_csv(f"{settings.ORIGINALDATA_FOLDER}/new_analytics_new.csv")
+            data_dict = special_course_details.NEWANALYTICS_NEW_DICT
+            rows = context.stages.run(
+                "user_input/new_analytics", ingest_new_analytics,
+                settings.NEWANALYTICS_NEW_FOLDER, settings.ORIGINALDATA_FOLDER,
+                inputs=sorted(glob.glob(f"{settings.NEWANALYTICS_NEW_FOLDER}/*.csv")),
+                outputs=[(settings.ORIGINALDATA_FOLDER, data_dict["name"])],
+                config={"dtypes": data_dict["dtypes"], "format": settings.INTERMEDIATE_FORMAT},
+            )
+            if rows is not None:
+                print_success(f'New Analytics: {rows} rows compiled')
  
         else:
             print(f'{settings.NEWANALYTICS_NEW_FOLDER}: No csvs found.')
@@ -40,12 +48,14 @@ def check_for_user_input_files():
             print_success(f'{settings.GRADEBOOK_FOLDER}: Gradebook data found, compiling...')
 
             #TODO look for a single csv file in gradebook_folder
-            gb_detail = pd.read_csv(f'{settings.GRADEBOOK_FOLDER}/gradebook.csv', nrows=2)
-            column_names = list(gb_detail.columns)
-            gb_user = pd.read_csv(f'{settings.GRADEBOOK_FOLDER}/gradebook.csv', names = column_names, skiprows=3)
-
-            gb_user.to_csv(f"{settings.ORIGINALDATA_FOLDER}/gradebook_user_data.csv", index=False)
-            gb_detail.to_csv(f"{settings.ORIGINALDATA_FOLDER}/gradebook_details.csv", index=False)
+            gradebook_file = f'{settings.GRADEBOOK_FOLDER}/gradebook.csv'
+            context.stages.run(
+                "user_input/gradebook", ingest_gradebook, gradebook_file, context,
+                inputs=[gradebook_file],
+                outputs=[(settings.ORIGINALDATA_FOLDER, "gradebook_user_data"),
+                         (settings.ORIGINALDATA_FOLDER, "gradebook_details")],
+                config={"format": settings.INTERMEDIATE_FORMAT},
+            )
 
         else:
             print(f'{settings.GRADEBOOK_FOLDER}: No csvs found.')
@@ -54,6 +64,58 @@ def check_for_user_input_files():
         shut_down(f'NO DATA FOLDER FOUND FOR: {settings.DATA_FOLDER}')
 
 
+def ingest_new_analytics(input_folder, output_folder, max_workers=None):
+    """Combines every New Analytics export in input_folder into one dataset
+
+    Files are read on a thread pool and written to the new_analytics_new
+    dataset in file order as soon as they are read. At most max_workers
+    files are in memory at a time, however many exports are in the folder.
+    Only the columns in NEWANALYTICS_NEW_DICT["dtypes"] are read, with
+    those dtypes; columns missing from a file are left empty.
+
+    Args:
+        input_folder (str): folder with the New Analytics CSV exports
+        output_folder (str): stage folder for the dataset
+        max_workers (int): defaults to settings.NEWANALYTICS_READ_WORKERS
+
+    Returns:
+        int: rows written
+    """
+    if max_workers is None:
+        max_workers = settings.NEWANALYTICS_READ_WORKERS
+    max_workers = max(1, max_workers)
+    data_dict = special_course_details.NEWANALYTICS_NEW_DICT
+    analytics_files = sorted(glob.glob(f"{input_folder}/*.csv"))
+
+    with DatasetWriter(output_folder, data_dict["name"]) as writer:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque()
+            for filename in analytics_files:
+                pending.append(executor.submit(_read_new_analytics_file, filename, data_dict["dtypes"]))
+                if len(pending) >= max_workers:
+                    writer.write(pending.popleft().result())
+            while pending:
+                writer.write(pending.popleft().result())
+    return writer.rows
+
+
+def ingest_gradebook(gradebook_file, context):
+    """Splits a Gradebook export into the gradebook_details (header rows) and gradebook_user_data datasets"""
+    gb_detail = pd.read_csv(gradebook_file, nrows=2)
+    column_names = list(gb_detail.columns)
+    gb_user = pd.read_csv(gradebook_file, names = column_names, skiprows=3)
+
+    context.write(gb_user, settings.ORIGINALDATA_FOLDER, "gradebook_user_data")
+    context.write(gb_detail, settings.ORIGINALDATA_FOLDER, "gradebook_details")
+
+
+def _read_new_analytics_file(filename, dtypes):
+    df = pd.read_csv(filename, usecols=lambda col: col in dtypes, dtype=dtypes)
+    df = df.reindex(columns=list(dtypes)).astype(dtypes)
+    df['file'] = pd.Series(filename, index=df.index, dtype='string')
+    return df
+
+
 if __name__ == "__main__":
     check_for_user_input_files()
 
@@ -1,16 +1,23 @@
 from ..canvas_helpers import create_canvas_object
 from .. import file_utils 
 from .. import settings
+from .. import profiling
 from ..utils import print_success
-from ..settings import COURSE_ID
+from ..http_utils import collect_validators
+from ..pagination_utils import fetch_all, fetch_all_nested, fetch_lists
+from ..data_utils import flatten_nested_fields, normalize_datetimes
+from ..storage import find_dataset
+from ..pipeline_context import PipelineContext
 from . import special_course_details
+from canvasapi.module import ModuleItem
 from yaspin import  yaspin
 import pandas as pd
 
 """ Creates the initial course data which will be output in data/COURSE_ID/raw/api_output 
 and creates a new_analytics_input folder for user
 """
-def create_df_and_csv(paginatedlist, data_dict, output_folder, iteration_call=None):
+def create_df_and_csv(paginatedlist, data_dict, output_folder, iteration_call=None, max_in_flight=None, context=None,
+                      validators=None):
     #TODO - figure out "best" structure for this kind of data
     
     """given a list of objects or paginatedlist return a dataframe
@@ -20,58 +27,214 @@ def create_df_and_csv(paginatedlist, data_dict, output_folder, iteration_call=No
         output_file (str)
         filter_to_columns (None or list)
         keep (bool)
+        max_in_flight (int): concurrent page requests, defaults to settings.PAGINATION_MAX_IN_FLIGHT
+        context (PipelineContext): keeps the dataset in memory for the next stage
+        validators (list): for a list fetched beforehand, the validators
+            collected while fetching it (see http_utils.collect_validators)
     
     Returns:
         df (dataframe) 
         
     Output:
-        csv in output_path if data available
+        dataset in output_folder (see storage.write_dataset) if data available
         
     """
-    output_file = f'{output_folder}/{data_dict["name"]}.csv'
+    output_file = f'{output_folder}/{data_dict["name"]}'
+    if max_in_flight is None:
+        max_in_flight = settings.PAGINATION_MAX_IN_FLIGHT
+    context = context or PipelineContext(memory_limit_mb=0)
 
     try:
-        if iteration_call:
-            iteration_list = []
-
-            with yaspin(text=f"Generating: {output_file}"):
-                for i in paginatedlist:
-                    items = getattr(i, iteration_call)
+        with yaspin(text=f"Generating: {output_file}"), collect_validators() as fetch_validators:
+            if iteration_call:
+                elements = fetch_all_nested(paginatedlist, iteration_call, max_in_flight)
+            else:
+                elements = fetch_all(paginatedlist, max_in_flight)
+        if validators is None:
+            validators = fetch_validators
+
+        df = None if _unchanged_download(data_dict, output_folder, validators, context) else _objects_to_df(elements)
+
+        if df is None:
+            # same Canvas responses as the dataset on disk was built from
+            output_file = find_dataset(output_folder, data_dict["name"])
+            print_success(f"Unchanged: {output_file}")
+            data_dict.update({"raw_file": output_file})
+            data_dict.update({'df': context.read(output_folder, data_dict["name"])})
+            return(data_dict)
+
+        df = flatten_nested_fields(df, data_dict.get("flatten_dict", {}))
+        normalize_datetimes(df)
+        output_file = context.write(df, output_folder, data_dict["name"])
+        context.stages.record(f'download/{data_dict["name"]}', data_dict["fingerprint"], [output_file])
+        print_success(f"Generated: {output_file}")
+        data_dict.update({"raw_file": output_file})
+        data_dict.update({'df': df})
+        return(data_dict)
+    
+    except Exception as e:
+        print(f'{e}')
+        return(data_dict.update({"df": None, "raw_file": None}))
 
-                    for j in items():
-                        j_dict = j.__dict__
-                        iteration_list.append(j_dict)
-            
-            df = pd.DataFrame(iteration_list)
+def _objects_to_df(objects):
+    """DataFrame of the attributes of Canvas objects, leaving out the requester each one holds"""
+    return(pd.DataFrame([{k: v for k, v in i.__dict__.items() if k != "_requester"} for i in objects]))
 
+def _unchanged_download(data_dict, output_folder, validators, context):
+    """True when the responses just downloaded are the ones the stored dataset was built from
 
-        else:            
-            with yaspin(text=f"Generating: {output_file}"):
-                df = pd.DataFrame([i.__dict__ for i in paginatedlist])
+    The fingerprint is left in data_dict["fingerprint"] for recording once
+    the dataset is written.
+    """
+    config = {"flatten_dict": data_dict.get("flatten_dict", {}), "format": settings.INTERMEDIATE_FORMAT}
+    fingerprint = context.stages.fingerprint(config=config, validators=validators)
+    data_dict["fingerprint"] = fingerprint
+    return(find_dataset(output_folder, data_dict["name"]) is not None
+           and context.stages.is_current(f'download/{data_dict["name"]}', fingerprint))
+
+def sync_submissions(course, data_dict, output_folder, full_refresh=None, context=None):
+    """Downloads submissions, only fetching what changed since the last run when possible
+
+    The stored watermark (settings.SYNC_STATE_FILE) is the start time of the
+    last successful sync. Submissions submitted or graded since then replace
+    the stored rows with the same id; rows for assignments no longer in the
+    course are dropped. Students removed from the course and submissions
+    reset or deleted don't show up as changes, so every submission is
+    downloaded again once the last full download is older than
+    settings.SUBMISSIONS_FULL_REFRESH_DAYS. Without a watermark or stored
+    dataset, or with full_refresh, every submission is downloaded.
 
+    Args:
+        course (canvasapi.course.Course)
+        data_dict (dict): ASSIGNMENTSUBMISSIONS_DICT
+        output_folder (str)
+        full_refresh (bool): defaults to settings.FULL_REFRESH
+        context (PipelineContext): keeps the dataset in memory for the next stage
 
-        print_success(f"Generated: {output_file}")
-        data_dict.update({"raw_csv": output_file})
-        df.to_csv(f'{output_file}')
+    Returns:
+        data_dict (dict) updated as by create_df_and_csv
+    """
+    if full_refresh is None:
+        full_refresh = settings.FULL_REFRESH
+    context = context or PipelineContext(memory_limit_mb=0)
+
+    name = data_dict["name"]
+    output_file = find_dataset(output_folder, name)
+    sync_state = file_utils.load_sync_state(settings.SYNC_STATE_FILE)
+    watermark = sync_state.get(name)
+    last_full_download = sync_state.get(f"{name}:full")
+    now = pd.Timestamp.now(tz="UTC")
+    # overlap with the previous run so clock skew can't drop changes
+    sync_started = (now - pd.Timedelta(minutes=5)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    full_download = (full_refresh or watermark is None or output_file is None or last_full_download is None
+                     or pd.Timestamp(last_full_download) < now - pd.Timedelta(days=settings.SUBMISSIONS_FULL_REFRESH_DAYS))
+
+    if full_download:
+        data_dict = create_df_and_csv(course.get_multiple_submissions(student_ids='all'), data_dict, output_folder,
+                                      context=context)
+    else:
+        data_dict = _upsert_submissions(course, data_dict, output_folder, watermark, context)
+
+    if data_dict and data_dict.get("df") is not None:
+        sync_state[name] = sync_started
+        if full_download:
+            sync_state[f"{name}:full"] = sync_started
+        file_utils.save_sync_state(settings.SYNC_STATE_FILE, sync_state)
+    return(data_dict)
+
+
+def _upsert_submissions(course, data_dict, output_folder, watermark, context):
+    """Merges submissions changed since watermark into the stored dataset"""
+    name = data_dict["name"]
+    output_file = f'{output_folder}/{name}'
+    try:
+        with yaspin(text=f"Updating: {output_file} (changes since {watermark})"):
+            changed = fetch_all(course.get_multiple_submissions(student_ids='all', submitted_since=watermark),
+                                settings.PAGINATION_MAX_IN_FLIGHT)
+            changed += fetch_all(course.get_multiple_submissions(student_ids='all', graded_since=watermark),
+                                 settings.PAGINATION_MAX_IN_FLIGHT)
+            changed_df = normalize_datetimes(_objects_to_df(changed))
+            stored_df = normalize_datetimes(context.read(output_folder, name)).drop(columns=["_requester"], errors="ignore")
+
+            if not changed_df.empty:
+                changed_df = changed_df.drop_duplicates(subset="id", keep="last")
+                stored_df = stored_df[~stored_df["id"].isin(changed_df["id"])]
+            df = pd.concat([stored_df, changed_df], ignore_index=True, sort=False)
+
+            # reconcile with the current course: deleted assignments. Not with the enrollments
+            # dataset, it only holds active and invited students and a full download has
+            # every student's submissions (removed students wait for the next full download)
+            assignments_dict = special_course_details.ASSIGNMENTS_DICT
+            if assignments_dict and assignments_dict.get("df") is not None and "id" in assignments_dict["df"]:
+                df = df[df["assignment_id"].isin(assignments_dict["df"]["id"])]
+            df = df.reset_index(drop=True)
+
+        output_file = context.write(df, output_folder, name)
+        print_success(f"Updated: {output_file} ({len(changed_df)} changed submissions)")
+        data_dict.update({"raw_file": output_file})
         data_dict.update({'df': df})
         return(data_dict)
-    
+
     except Exception as e:
         print(f'{e}')
-        return(data_dict.update({"df": None, "raw_csv": None}))
+        return(data_dict.update({"df": None, "raw_file": None}))
+
 
-def get_course_data(course, output_folder):
+def get_course_data(course, output_folder, context=None):
 
-    special_course_details.ENROLLMENTS_DICT = create_df_and_csv(course.get_enrollments(), special_course_details.ENROLLMENTS_DICT, output_folder)
-    special_course_details.ASSIGNMENTS_DICT = create_df_and_csv(course.get_assignments(), special_course_details.ASSIGNMENTS_DICT, output_folder)
-    special_course_details.ASSIGNMENTSUBMISSIONS_DICT = create_df_and_csv(course.get_multiple_submissions(student_ids='all'), special_course_details.ASSIGNMENTSUBMISSIONS_DICT, output_folder)
+    special_course_details.ENROLLMENTS_DICT = create_df_and_csv(course.get_enrollments(), special_course_details.ENROLLMENTS_DICT, output_folder, context=context)
+    special_course_details.ASSIGNMENTS_DICT = create_df_and_csv(course.get_assignments(), special_course_details.ASSIGNMENTS_DICT, output_folder, context=context)
+    special_course_details.ASSIGNMENTSUBMISSIONS_DICT = sync_submissions(course, special_course_details.ASSIGNMENTSUBMISSIONS_DICT, output_folder, context=context)
     
-    #modules and module items
-    special_course_details.MODULES_DICT = create_df_and_csv(course.get_modules(), special_course_details.MODULES_DICT, output_folder)
-    special_course_details.MODULEITEMS_DICT = create_df_and_csv(course.get_modules(), special_course_details.MODULEITEMS_DICT, output_folder, "get_module_items")
+    #modules and module items (one modules request with items embedded)
+    with collect_validators() as validators:
+        modules, module_items = get_modules_and_items(course)
+    special_course_details.MODULES_DICT = create_df_and_csv(modules, special_course_details.MODULES_DICT, output_folder, context=context, validators=validators)
+    special_course_details.MODULEITEMS_DICT = create_df_and_csv(module_items, special_course_details.MODULEITEMS_DICT, output_folder, context=context, validators=validators)
+
 
+def get_modules_and_items(course, max_in_flight=None):
+    """Returns (modules, module items) from a single modules request with items embedded
 
-def create_course_data():
+    Canvas leaves items out of a module it deems too large; for those modules
+    (items missing or fewer than items_count) the items are requested per
+    module instead. Modules are returned without the embedded items and items
+    are built as get_module_items builds them, so both datasets are the same
+    as requesting them separately.
+
+    Args:
+        course (canvasapi.course.Course)
+        max_in_flight (int): concurrent page requests, defaults to settings.PAGINATION_MAX_IN_FLIGHT
+
+    Returns:
+        (list of Module, list of ModuleItem)
+    """
+    if max_in_flight is None:
+        max_in_flight = settings.PAGINATION_MAX_IN_FLIGHT
+
+    modules = fetch_all(course.get_modules(include=["items"]), max_in_flight)
+    items_per_module = []
+    truncated = []
+    for module in modules:
+        items = module.__dict__.pop("items", None)
+        if items is None or len(items) != getattr(module, "items_count", len(items)):
+            items_per_module.append(None)
+            truncated.append(module)
+        else:
+            items_per_module.append([
+                ModuleItem(module._requester, dict(item, course_id=module.course_id)) for item in items
+            ])
+
+    if truncated:
+        fetched = iter(fetch_lists([m.get_module_items() for m in truncated], max_in_flight))
+        items_per_module = [items if items is not None else next(fetched) for items in items_per_module]
+
+    module_items = [item for items in items_per_module for item in items]
+    return(modules, module_items)
+
+
+@profiling.stage("create_course_data")
+def create_course_data(context=None):
     # establish canvas connection
     file_utils.create_folder(settings.APIOUTPUT_FOLDER)
     file_utils.create_folder(settings.NEWANALYTICS_NEW_FOLDER)
@@ -80,10 +243,10 @@ def create_course_data():
     canvas, auth_header = create_canvas_object()
     
     #create a project structure for the new course
-    course = canvas.get_course(COURSE_ID)
+    course = canvas.get_course(settings.COURSE_ID)
 
 
-    get_course_data(course, settings.APIOUTPUT_FOLDER)
+    get_course_data(course, settings.APIOUTPUT_FOLDER, context)
     
     print_success("Done! Course data downloaded!")
 
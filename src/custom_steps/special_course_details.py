@@ -116,8 +116,15 @@ ENROLLMENTS_DICT = {
             'course_section_id': 'enrollment_course_section',
             'role': 'user_role',
             'enrollment_state': 'enrollment_state',
-            'user': 'user',
-            'grades': 'grades'
+            'user_name': 'student',
+            'grades_current_score': 'gb_current_score',
+            'grades_final_score': 'gb_final_score'
+    },
+    # nested objects flattened when fetched: {column: {key: (new column, dtype)}}
+    "flatten_dict": {
+            'user': {'name': ('user_name', 'object')},
+            'grades': {'current_score': ('grades_current_score', 'float64'),
+                       'final_score': ('grades_final_score', 'float64')}
     }
 }
 
@@ -154,6 +161,19 @@ NEWANALYTICS_NEW_DICT = {
             'Last Viewed': 'last_access_datetime',
             'First Viewed': 'first_access_datetime',
             'file': 'original_data_file'
+    },
+    # columns read from each New Analytics export, and their dtypes
+    "dtypes": {
+            'Student Id': 'Int64',
+            'Course Id': 'Int64',
+            'Student Name': 'string',
+            'Content Type': 'string',
+            'Content Name': 'string',
+            'Times Viewed': 'Int64',
+            'Times Participated': 'Int64',
+            'Start Date': 'string',
+            'Last Viewed': 'string',
+            'First Viewed': 'string'
     }
 }
 
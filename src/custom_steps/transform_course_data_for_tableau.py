@@ -1,71 +1,65 @@
 import pandas as pd
 import numpy as np
-import datetime
-import re
-import ast
-from ..settings import CLEANEDDATA_FOLDER, TABLEAU_FOLDER, INST_CODE
 from ..file_utils import create_folder
-from ..utils import print_success
+from ..utils import print_success, print_line
+from ..pipeline_context import PipelineContext
+from ..stage_scheduler import Stage, run_stages
+from .. import settings
+from .. import profiling
+from ..data_utils import CANVAS_DATETIME_FORMAT
+from ..run_report import record_rows
 
-def _extract_file_type(somestring):
-    try:
-        match_str = re.compile("(.*)(\.)([a-zA-Z]{3}$)") #TODO - 4 chars, i.e) .jpeg
-        match = re.match(match_str, somestring)
-        if match:
-            return(match.group(3))
-    except:
-        return(None)
-    else:
-        return(None)
-
-def _parse_date_time(str):
-    try:
-        date = datetime.datetime.strptime(str, "%Y-%m-%dT%H:%M:%SZ")
-        date = format(date, "%Y-%m-%d")
-        return(date)
-    except:
-        pass
+ENROLLMENT_COLUMNS = ["user_id", "student", "user_role", "gb_current_score", "gb_final_score",
+                      "enrollment_type", "enrollment_state"]
+
+# cleaned_data datasets read and files written by transform_course_data_for_tableau
+TABLEAU_INPUTS = ["module_items", "modules", "new_analytics_new", "enrollments", "assignments",
+                  "assignment_submissions"]
+TABLEAU_OUTPUTS = ["module_and_items.csv", "user_final_score.csv", "student_analytics_noimages.csv",
+                   "student_assignment_details.csv"]
+
+FILE_EXTENSION = r"\.([a-zA-Z]{3,4})$"
+# New Analytics rows of these file types are left out of student_analytics_noimages.csv
+IMAGE_TYPES = ["jpg", "jpeg", "png", "gif", "svg", "bmp", "webp"]
+
+def _extract_file_types(series):
+    """Returns the 3 or 4 letter file extension of each name (e.g. pdf, jpeg), NaN if none"""
+    return(series.astype(object).str.extract(FILE_EXTENSION, expand=False))
 
-def combine_course_structure(module_items=None, modules=None):
+def _parse_date_time(series):
+    """Returns the dates (YYYY-MM-DD) of a series of Canvas timestamps, NaN where missing"""
+    dates = pd.to_datetime(series, utc=True, errors="coerce", format="ISO8601")
+    return(dates.dt.strftime("%Y-%m-%d"))
 
-    if module_items == None:
-        module_items = pd.read_csv(f'{CLEANEDDATA_FOLDER}/module_items.csv')
+def combine_course_structure(module_items=None, modules=None, context=None):
+    context = context or PipelineContext(memory_limit_mb=0)
 
-    if modules == None:
-        modules = pd.read_csv(f'{CLEANEDDATA_FOLDER}/modules.csv')
+    if module_items is None:
+        module_items = context.read(settings.CLEANEDDATA_FOLDER, "module_items")
+
+    if modules is None:
+        modules = context.read(settings.CLEANEDDATA_FOLDER, "modules")
 
     modules_and_items = module_items.merge(modules, on=["course_id", "module_id"])
-    modules_and_items['item_order'] = modules_and_items.apply(lambda x: x['module_position'] 
-                                                            + x['module_item_position']/100, axis=1)
-    modules_and_items['item_overall_order'] = np.arange(len(modules_and_items.sort_values('item_order')))
-    modules_and_items.to_csv(f'{TABLEAU_FOLDER}/module_and_items.csv', index=False)
+    modules_and_items['item_order'] = modules_and_items['module_position'] + modules_and_items['module_item_position']/100
+    modules_and_items['item_overall_order'] = np.arange(len(modules_and_items))
+    record_rows(len(modules_and_items))
+    modules_and_items.to_csv(f'{settings.TABLEAU_FOLDER}/module_and_items.csv', index=False)
 
 
-def combine_enrollment_and_new_analytics_new():
+def combine_enrollment_and_new_analytics_new(context=None):
+    context = context or PipelineContext(memory_limit_mb=0)
 
-    new_analytics =  pd.read_csv(f'{CLEANEDDATA_FOLDER}/new_analytics_new.csv')
+    new_analytics =  context.read(settings.CLEANEDDATA_FOLDER, "new_analytics_new")
     new_analytics['user_id'] = new_analytics['global_user_id']
     new_analytics['course_id'] = new_analytics['global_course_id']
 
-    enrollment = pd.read_csv(f'{CLEANEDDATA_FOLDER}/enrollments.csv')
+    enrollment = context.read(settings.CLEANEDDATA_FOLDER, "enrollments", columns=ENROLLMENT_COLUMNS)
 
     try:
         # filter to active student data only
-        
-        def get_value(x, key):
-            try:
-                return(ast.literal_eval(x).get(key))
-            except:
-                return(None)
-
-        enrollment["student"] = enrollment["user"].apply(lambda x: get_value(x, "name"))
-
-        user_scores = enrollment[["user_id", "student", "user_role", "grades"]].copy()
-        
-        user_scores["gb_current_score"] = user_scores["grades"].apply(lambda x: get_value(x, "current_score"))
-        user_scores["gb_final_score"] = user_scores["grades"].apply(lambda x: get_value(x, "final_score"))
-        user_scores = user_scores[["user_id", "student", "user_role", "gb_current_score", "gb_final_score"]]
-        user_scores.to_csv(f"{TABLEAU_FOLDER}/user_final_score.csv", index=False)
+        user_scores = enrollment[["user_id", "student", "user_role", "gb_current_score", "gb_final_score"]]
+        user_scores.to_csv(f"{settings.TABLEAU_FOLDER}/user_final_score.csv", index=False)
 
 
         enrollment = enrollment[["user_id", "student", "enrollment_type", "enrollment_state"]]
@@ -82,20 +76,21 @@ def combine_enrollment_and_new_analytics_new():
 
         student_analytics = enrollment.merge(new_analytics, how="left", on="user_id")
         
-        keepfiles = [None, "csv", "zip", "txt", "pdf"]  
-        student_analytics['filetype'] = student_analytics["content_name"].apply(lambda x: _extract_file_type(x))
-        student_analytics = student_analytics.query("`filetype` == @keepfiles")
+        # drop images, keep every other file type and rows without a file extension
+        student_analytics['filetype'] = _extract_file_types(student_analytics["content_name"])
+        student_analytics = student_analytics[~student_analytics['filetype'].str.lower().isin(IMAGE_TYPES)]
         #output = student_analytics.drop(["global_user_id", "global_course_id"], axis=1)
         #output.to_csv(f'{TABLEAU_FOLDER}/student_analytics_new_noimages.csv', index=False)
 
         return(student_analytics)
         
     except Exception as e:
-        print(f"error: {e}")
+        print_line(f"error: {e}")
 
 
-def course_assignments_and_dates(student_analytics):
+def course_assignments_and_dates(student_analytics, context=None):
     # NOT USED
+    context = context or PipelineContext(memory_limit_mb=0)
     student_analytics = student_analytics[student_analytics['global_user_id'].notna()]
 
     first_date = student_analytics['access_date'].min()
@@ -105,48 +100,69 @@ def course_assignments_and_dates(student_analytics):
     dates_df = pd.DataFrame({"date": all_dates})
     dates_df["date"] = dates_df["date"].apply(lambda x: str(x))
 
-    assignments = pd.read_csv(f'{CLEANEDDATA_FOLDER}/assignments.csv')
-    assignments = assignments[['assignment_id', 'assignment_due_at', 'assignment_title']]
+    assignments = context.read(settings.CLEANEDDATA_FOLDER, "assignments",
+                               columns=['assignment_id', 'assignment_due_at', 'assignment_title'])
 
 
 
-    assignments['date'] = assignments['assignment_due_at'].apply(lambda x: _parse_date_time(x))
+    assignments['date'] = _parse_date_time(assignments['assignment_due_at'])
     dates_df = dates_df.merge(assignments, on="date", how="left")
-    dates_df.to_csv(f"{TABLEAU_FOLDER}/course_dates.csv")
+    dates_df.to_csv(f"{settings.TABLEAU_FOLDER}/course_dates.csv")
 
 
-def clean_submissions_data():
-    gb_info = pd.read_csv(f'{CLEANEDDATA_FOLDER}/assignments.csv')
+def clean_submissions_data(context=None):
+    context = context or PipelineContext(memory_limit_mb=0)
+    gb_info = context.read(settings.CLEANEDDATA_FOLDER, "assignments")
     gb_info = gb_info.drop(['assignment_description', 'assignment_workflow_state',\
                             'assignment_is_quiz', 'assignment_is_published'], axis=1)
 
-    submissions_df = pd.read_csv(f'{CLEANEDDATA_FOLDER}/assignment_submissions.csv').drop('course_id', axis=1)
+    submissions_df = context.read(settings.CLEANEDDATA_FOLDER, "assignment_submissions").drop('course_id', axis=1)
     submissions_df = submissions_df.merge(gb_info)
 
-    submissions_df['percent_score'] = submissions_df.apply(lambda x: x['assignment_score']/x['assignment_points_possible'] if x['assignment_points_possible'] > 0 else None, axis=1)
-    submissions_df.to_csv(f'{TABLEAU_FOLDER}/student_assignment_details.csv')
+    points_possible = submissions_df['assignment_points_possible']
+    submissions_df['percent_score'] = submissions_df['assignment_score'] / points_possible.where(points_possible > 0)
+    record_rows(len(submissions_df))
+    submissions_df.to_csv(f'{settings.TABLEAU_FOLDER}/student_assignment_details.csv', date_format=CANVAS_DATETIME_FORMAT)
 
-def clean_gradebook_data():
-    gb_data = pd.read_csv(f'{CLEANEDDATA_FOLDER}/gradebook_user_data.csv') 
-    gb_data.to_csv(f"{TABLEAU_FOLDER}/user_final_score.csv", index=False)
+def clean_gradebook_data(context=None):
+    context = context or PipelineContext(memory_limit_mb=0)
+    gb_data = context.read(settings.CLEANEDDATA_FOLDER, "gradebook_user_data") 
+    gb_data.to_csv(f"{settings.TABLEAU_FOLDER}/user_final_score.csv", index=False)
 
-def transform_course_data_for_tableau():
+@profiling.stage("transform_course_data_for_tableau")
+def transform_course_data_for_tableau(context=None, max_workers=None):
+    """Writes the Tableau tables, running independent ones up to max_workers (default settings.TRANSFORM_WORKERS) at a time"""
 
-    create_folder(TABLEAU_FOLDER)
-    
-    combine_course_structure() # right now this just creates outputs 
-    stud_analytics_new = combine_enrollment_and_new_analytics_new()
+    create_folder(settings.TABLEAU_FOLDER)
+    context = context or PipelineContext(memory_limit_mb=0)
+    if max_workers is None:
+        max_workers = settings.TRANSFORM_WORKERS
+
+    context.stages.run(
+        "tableau", _write_tableau_outputs, context, max_workers,
+        inputs=[(settings.CLEANEDDATA_FOLDER, name) for name in TABLEAU_INPUTS],
+        outputs=[f"{settings.TABLEAU_FOLDER}/{file}" for file in TABLEAU_OUTPUTS],
+    )
+
+    print_success("Data formatted for Tableau complete!")
+
+def write_student_analytics(context=None):
+    stud_analytics_new = combine_enrollment_and_new_analytics_new(context)
 
     merged_analytics = stud_analytics_new
     merged_analytics = merged_analytics.drop_duplicates(subset=['user_id', 'student', 'content_type', 'content_name', 'access_date'], keep='first')
                                                         
     
-    merged_analytics.to_csv(f'{TABLEAU_FOLDER}/student_analytics_noimages.csv', index=False)
-    #course_assignments_and_dates(stud_analytics) 
-    clean_submissions_data()
-    #clean_gradebook_data()
-
-    print_success("Data formatted for Tableau complete!")
+    record_rows(len(merged_analytics))
+    merged_analytics.to_csv(f'{settings.TABLEAU_FOLDER}/student_analytics_noimages.csv', index=False)
+
+def _write_tableau_outputs(context, max_workers):
+    # each table reads cleaned_data only, none depends on another
+    run_stages([
+        Stage("tableau/module_and_items", combine_course_structure, kwargs={"context": context}),
+        Stage("tableau/student_analytics", write_student_analytics, args=(context,)),
+        Stage("tableau/student_assignment_details", clean_submissions_data, args=(context,)),
+    ], max_workers)
 
 if __name__ == "__main__":
     transform_course_data_for_tableau()
\ No newline at end of file
@@ -1,6 +1,10 @@
 import pandas as pd
 from ..file_utils import create_folder
+from ..data_utils import flatten_nested_fields, normalize_datetimes
+from ..pipeline_context import PipelineContext
+from ..stage_scheduler import Stage, run_stages
 from .. import settings
+from .. import profiling
 from . import special_course_details
 
 def clean_columns_from_rename_dict(df, rename_dict, drop_rest=False): 
@@ -37,37 +41,53 @@ def clean_columns_from_rename_dict(df, rename_dict, drop_rest=False):
     return(df)
     
 
-def transform_data(detail_dict, drop_rest=False):
+def transform_data(detail_dict, drop_rest=False, context=None):
     # TODO ADD DATE TO FILE AS HEADER
     file = f'{detail_dict["name"]}'
     rename_dict = detail_dict["rename_dict"]
 
-    in_file =  f'{settings.ORIGINALDATA_FOLDER}/{file}.csv'
-    out_file = f'{settings.CLEANEDDATA_FOLDER}/{file}.csv'
-
-    df = pd.read_csv(in_file)
+    context = context or PipelineContext(memory_limit_mb=0)
+    df = normalize_datetimes(context.read(settings.ORIGINALDATA_FOLDER, file))
+    # no-op for data flattened at fetch time, kept for older downloads
+    df = flatten_nested_fields(df, detail_dict.get("flatten_dict", {}))
 
     df = (df.
          pipe(clean_columns_from_rename_dict, rename_dict=rename_dict, drop_rest=drop_rest))
 
-    #print(f'\nWRITING: {out_file}.csv\n')
-    df.to_csv(f'{out_file}', index=False)
+    context.write(df, settings.CLEANEDDATA_FOLDER, file)
     
     return(df)
 
 # MOST OF THESE FOLDERS NEED TO CHANGE
 
-def transform_course_data():
+@profiling.stage("transform_course_data")
+def transform_course_data(context=None, max_workers=None):
+    """Runs transform_data for every dataset, up to max_workers (default settings.TRANSFORM_WORKERS) at a time"""
     create_folder(settings.CLEANEDDATA_FOLDER)
     #create_folder(settings.CLEANDDATA_TRACKING_TRANSFORMATIONS)
+    context = context or PipelineContext(memory_limit_mb=0)
+    if max_workers is None:
+        max_workers = settings.TRANSFORM_WORKERS
 
-    transform_data(special_course_details.ASSIGNMENTS_DICT, True)
-    transform_data(special_course_details.MODULEITEMS_DICT, True)
-    transform_data(special_course_details.MODULES_DICT, True)
-    transform_data(special_course_details.ASSIGNMENTSUBMISSIONS_DICT, True)
-    transform_data(special_course_details.ENROLLMENTS_DICT, True) 
-    transform_data(special_course_details.NEWANALYTICS_NEW_DICT, True)
-    transform_data(special_course_details.GRADEBOOKUSERDATA_DICT, True)
+    # every dataset is transformed on its own, none depends on another
+    stages = []
+    for detail_dict in [
+        special_course_details.ASSIGNMENTS_DICT,
+        special_course_details.MODULEITEMS_DICT,
+        special_course_details.MODULES_DICT,
+        special_course_details.ASSIGNMENTSUBMISSIONS_DICT,
+        special_course_details.ENROLLMENTS_DICT,
+        special_course_details.NEWANALYTICS_NEW_DICT,
+        special_course_details.GRADEBOOKUSERDATA_DICT,
+    ]:
+        name = f'transform/{detail_dict["name"]}'
+        stages.append(Stage(name, context.stages.run, args=(name, transform_data, detail_dict, True, context), kwargs={
+            "inputs": [(settings.ORIGINALDATA_FOLDER, detail_dict["name"])],
+            "outputs": [(settings.CLEANEDDATA_FOLDER, detail_dict["name"])],
+            "config": {"rename_dict": detail_dict["rename_dict"], "flatten_dict": detail_dict.get("flatten_dict", {}),
+                       "format": settings.INTERMEDIATE_FORMAT},
+        }))
+    run_stages(stages, max_workers)
 
 if __name__ == "__main__":
     transform_course_data()
\ No newline at end of file
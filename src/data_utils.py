@@ -2,10 +2,16 @@
 DataFrame helpers for Canvas module/course processing.
 """
 
+import numpy as np
 import pandas as pd
 from ast import literal_eval
 import re
 
+# Canvas timestamp fields, typed as datetime64[ns, UTC] by normalize_datetimes
+CANVAS_DATETIME_FIELDS = ["completed_at", "unlock_at", "due_at", "submitted_at", "created_at"]
+# how Canvas writes timestamps, used when typed columns go back to raw CSV
+CANVAS_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
 def create_dict_from_object(theobj, list_of_attributes):
     def get_attribute_if_available(theobj, attrname):
         if hasattr(theobj, attrname):
@@ -18,9 +24,26 @@ def create_dict_from_object(theobj, list_of_attributes):
     return mydict
 
 def _dict_to_cols(dataframe, col_to_expand, expand_name):
-    dataframe[col_to_expand] = dataframe[col_to_expand].apply(_all_dict_to_str)
+    """Expands a column of dicts (or dict strings) into one column per key
+
+    Values are stringified as _all_dict_to_str does and keys are prefixed with
+    expand_name unless they already contain it. The new columns are built in
+    one pass over the column; dict strings repeat heavily (e.g. completion
+    requirements), so each distinct string is parsed only once.
+    """
+    parsed = {}
+    records = []
+    for d in dataframe[col_to_expand].tolist():
+        if isinstance(d, dict):
+            records.append({k: str(v) for k, v in d.items()})
+        elif isinstance(d, str):
+            if d not in parsed:
+                parsed[d] = _all_dict_to_str(d)
+            records.append(parsed[d])
+        else:
+            records.append(_all_dict_to_str(d) or {})
     original_df = dataframe.drop([col_to_expand], axis=1)
-    extended_df = dataframe[col_to_expand].apply(pd.Series, dtype='object')
+    extended_df = pd.DataFrame(records, index=dataframe.index, dtype='object')
     extended_df.columns = [
         i if bool(re.search(expand_name, i)) else "{}{}".format(str(expand_name), str(i))
         for i in extended_df.columns
@@ -29,9 +52,19 @@ def _dict_to_cols(dataframe, col_to_expand, expand_name):
     return new_df
 
 def _list_to_df(dataframe, col_to_expand):
-    series = dataframe.apply(lambda x: pd.Series(x[col_to_expand]), axis=1).stack().reset_index(level=1, drop=True)
-    series.name = col_to_expand
-    new_df = dataframe.drop(col_to_expand, axis=1).join(series)
+    """Returns one row per list element of col_to_expand (moved to the last column)
+
+    Missing elements are dropped, and rows with an empty or missing list are
+    kept once with a missing value.
+    """
+    exploded = dataframe[col_to_expand].reset_index(drop=True).explode()
+    is_null = exploded.isna()
+    has_value = (~is_null).groupby(level=0).transform("any")
+    exploded = exploded[~is_null | (~has_value & ~exploded.index.duplicated())]
+    exploded[exploded.isna()] = np.nan
+
+    new_df = dataframe.drop(col_to_expand, axis=1).iloc[exploded.index.to_numpy()]
+    new_df[col_to_expand] = exploded.to_numpy()
     return new_df
 
 def _all_dict_to_str(d):
@@ -46,10 +79,141 @@ def _all_dict_to_str(d):
             new = {k: str(v) for k, v in d.items()}
             return new
 
-def _clean_datetime_value(datetime_string):
-    if datetime_string is None:
-        return datetime_string
-    if isinstance(datetime_string, str):
-        x = datetime_string.replace("T", " ")
-        return x.replace("Z", "")
-    raise TypeError("Expected datetime_string to be of type string (or None)")
+def flatten_nested_fields(dataframe, flatten_dict):
+    """Replaces nested object columns with one typed column per listed key
+
+    Each nested value is read once; values that are not dicts (e.g. missing)
+    give missing fields. Dict strings from CSVs written before flattening are
+    parsed once per row.
+
+    Args:
+        dataframe (DataFrame)
+        flatten_dict (dict): {column: {key: (new column, dtype)}}, columns
+            not in the DataFrame are skipped
+
+    Returns:
+        DataFrame: without the nested columns, with the new ones appended
+    """
+    for col, fields in flatten_dict.items():
+        if col not in dataframe.columns:
+            continue
+        values = [_as_dict(v) for v in dataframe[col].tolist()]
+        for key, (new_col, dtype) in fields.items():
+            dataframe[new_col] = pd.Series([v.get(key) for v in values], index=dataframe.index, dtype=dtype)
+        dataframe = dataframe.drop(col, axis=1)
+    return dataframe
+
+def _as_dict(value):
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str):
+        try:
+            value = literal_eval(value)
+        except (ValueError, SyntaxError):
+            return {}
+        return value if isinstance(value, dict) else {}
+    return {}
+
+def normalize_datetimes(dataframe, columns=None):
+    """Converts Canvas ISO-8601 timestamp columns to datetime64[ns, UTC] in place
+
+    Missing or unparseable values become NaT. Columns not in the DataFrame
+    (or already converted) are skipped.
+
+    Args:
+        dataframe (DataFrame)
+        columns (list of str): defaults to CANVAS_DATETIME_FIELDS
+
+    Returns:
+        DataFrame: the same DataFrame
+    """
+    for col in CANVAS_DATETIME_FIELDS if columns is None else columns:
+        if col in dataframe.columns and not isinstance(dataframe[col].dtype, pd.DatetimeTZDtype):
+            dataframe[col] = pd.to_datetime(
+                dataframe[col], utc=True, errors="coerce", format="ISO8601"
+            ).astype("datetime64[ns, UTC]")
+    return dataframe
+
+# smallest first, see _as_compact_integers
+_INTEGER_DTYPES = ["int8", "int16", "int32", "int64"]
+
+def compact_dtypes(dataframe, max_category_ratio=0.5, name="DataFrame"):
+    """Returns a copy of dataframe with smaller dtypes and prints its memory before and after
+
+    - integer columns, and text columns holding only integers (e.g. ids),
+      become the smallest integer dtype that fits (nullable if values are missing)
+    - other text columns whose distinct values are at most max_category_ratio
+      of the rows (e.g. course_name, module_name, state) become categoricals
+
+    Values are unchanged, so the CSV written from the result is the same.
+
+    Args:
+        dataframe (DataFrame)
+        max_category_ratio (float): distinct values / rows below which a text
+            column becomes categorical
+        name (str): label for the printed report
+
+    Returns:
+        DataFrame
+    """
+    before = dataframe.memory_usage(deep=True).sum()
+    compacted = {}
+    for col in dataframe.columns:
+        values = dataframe[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_integer_dtype(values.dtype) or values.dtype == object:
+            integers = _as_compact_integers(values)
+            if integers is not None:
+                compacted[col] = integers
+                continue
+        if values.dtype == object and values.nunique() <= max_category_ratio * len(values):
+            compacted[col] = values.astype("category")
+
+    result = dataframe.assign(**compacted) if compacted else dataframe.copy()
+    after = result.memory_usage(deep=True).sum()
+    print(f"{name}: {before / 2**20:.1f} MiB -> {after / 2**20:.1f} MiB with compact dtypes")
+    return result
+
+def concat_compact(list_of_dfs):
+    """pd.concat that keeps categorical columns categorical
+
+    pd.concat falls back to object for categoricals with different
+    categories, so categories are unioned before concatenating.
+    """
+    categorical = [
+        set(df.columns[[isinstance(dt, pd.CategoricalDtype) for dt in df.dtypes]]) for df in list_of_dfs
+    ]
+    shared = set.intersection(*categorical) if categorical else set()
+    for col in shared:
+        categories = list_of_dfs[0][col].cat.categories
+        for df in list_of_dfs[1:]:
+            categories = categories.union(df[col].cat.categories)
+        list_of_dfs = [df.assign(**{col: df[col].cat.set_categories(categories)}) for df in list_of_dfs]
+    return pd.concat(list_of_dfs, axis=0, ignore_index=True)
+
+def _as_compact_integers(values):
+    """Returns values as the smallest integer dtype that holds them, None if they aren't all integers"""
+    present = values.dropna()
+    if present.empty:
+        return None
+    if values.dtype == object:
+        inferred = pd.api.types.infer_dtype(present, skipna=False)
+        if inferred == "string":
+            # no leading zeros or signs that the integer would not write back
+            if not present.str.fullmatch(r"-?[1-9][0-9]*|0").all():
+                return None
+        elif inferred != "integer":
+            return None
+        try:
+            present = present.astype("int64")
+        except (OverflowError, ValueError):
+            return None
+
+    low, high = present.min(), present.max()
+    dtype = next(d for d in _INTEGER_DTYPES if np.iinfo(d).min <= low and high <= np.iinfo(d).max)
+    if len(present) == len(values):
+        return present.astype(dtype)
+    integers = pd.Series(pd.NA, index=values.index, dtype=dtype.capitalize())
+    integers[values.notna().to_numpy()] = present.astype(dtype).to_numpy()
+    return integers
@@ -2,16 +2,22 @@
 File/folder and CSV helpers.
 """
 
+import json
 import os
 import shutil
 from pathlib import Path
 import pandas as pd
 from shutil import copyfile
 
-from .settings import status, COURSE_ID
+from . import settings
+from .data_utils import compact_dtypes, concat_compact
 from .logging_utils import _output_status_table
+from .run_report import write_run_report
 from .utils import print_success, print_unexpected
 
+# timestamp format of the Module Progress outputs
+TABLEAU_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
 
 def create_folder(folder_path):
     Path(folder_path).mkdir(parents=True, exist_ok=True)
@@ -50,23 +56,55 @@ def _copy_to_folder(src_folder, dst_folder, file_name, print_details=False):
         print(f'Error: {e}')
     return
 
+def load_sync_state(path):
+    """Returns the stored incremental-sync watermarks (empty dict if none)"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_sync_state(path, sync_state):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(sync_state, f, indent=2)
+
 def write_data_directory(dataframes, cid):
+    """Writes each DataFrame to data/cid/name.csv
+
+    Args:
+        dataframes (dict): name -> DataFrame
+        cid (int): course id
+
+    Returns:
+        dict: the DataFrames written, with compact dtypes when settings.COMPACT_DTYPES is set
+    """
     course_path = _make_output_dir(cid)
+    written = {}
     for name, dataframe in dataframes.items():
+        if settings.COMPACT_DTYPES:
+            dataframe = compact_dtypes(dataframe, name=name)
         path = Path(f"{course_path}/{name}.csv")
-        dataframe.to_csv(path, index=False)
+        dataframe.to_csv(path, index=False, date_format=TABLEAU_DATETIME_FORMAT)
+        written[name] = dataframe
+    return written
 
 
 def write_tableau_directory(COURSE_ID, list_of_dfs):
     tableau_path = _make_output_dir(f"{COURSE_ID}/module_progress-Tableau")
-    union = pd.concat(list_of_dfs, axis=0, ignore_index=True)
+    if settings.COMPACT_DTYPES:
+        union = concat_compact(list_of_dfs)
+        print(f"module_data: {union.memory_usage(deep=True).sum() / 2**20:.1f} MiB")
+    else:
+        union = pd.concat(list_of_dfs, axis=0, ignore_index=True)
     module_data_output_path = tableau_path / "module_data.csv"
-    union.to_csv(module_data_output_path, index=False)
+    union.to_csv(module_data_output_path, index=False, date_format=TABLEAU_DATETIME_FORMAT)
     src = Path(f"course_entitlements.csv")
-    dst = Path(f"data/module_progress-Tableau/course_entitlements.csv")
+    dst = tableau_path / "course_entitlements.csv"
     print(f"Module Progress: {src}, {dst}")
     shutil.copyfile(src, dst)
     _output_status_table(tableau_path)
+    write_run_report(tableau_path)
 
 def _make_output_dir(name):
     directory_path = Path(f"data/{name}")
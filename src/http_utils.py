@@ -0,0 +1,379 @@
+"""
+HTTP helpers for the requests session underneath canvasapi.
+
+configure_canvas_session gives a Canvas object the one shared, pooled
+requests session of the process, so every client reuses the same kept-alive
+(TLS) connections. The session's CanvasHTTPAdapter applies request timeouts,
+sends every request through the process-wide rate limiter, and keeps an
+on-disk cache of GET responses that it revalidates with If-None-Match /
+If-Modified-Since, so unchanged pages come back as a 304 with no payload and
+are answered from disk. collect_validators records the validators of the
+responses received, so a stage can tell whether the data it downloaded
+changed (see stage_cache.py). api_counters totals the requests, pages,
+bytes and rate limit cost of the process (see run_report.py).
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import requests
+import urllib3.poolmanager
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from . import settings
+from .rate_limiter import send_with_rate_limit
+
+# headers describing the wire format of the original payload, not the cached body
+_DROPPED_HEADERS = ("Content-Encoding", "Content-Length", "Transfer-Encoding")
+
+
+class ResponseCache:
+    """On-disk store of response bodies with LRU eviction
+
+    Each entry is a pair of files named after the cache key: <key>.body holds
+    the decoded body and <key>.json the status, headers, validators and the
+    digest of the body. The metadata file's mtime is the last time the entry
+    was used.
+
+    Both files are written to temporary names and moved into place, the
+    metadata last, and get only returns a body matching the digest in the
+    metadata. A crash between the two writes, or a thread or process (e.g.
+    orchestrator workers sharing the folder) reading while an entry is
+    replaced, is then a cache miss rather than an old validator paired with
+    a new body.
+
+    Args:
+        folder (str): cache directory, created if missing
+        max_bytes (int): size cap for all bodies in the cache
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = sum(p.stat().st_size for p in self.folder.glob("*.body"))
+
+    def get(self, key):
+        """Returns (metadata dict, body bytes) or None if not cached"""
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        if meta.get("body_sha256") != hashlib.sha256(body).hexdigest():
+            return None
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return meta, body
+
+    def put(self, key, response):
+        """Stores a response that carries an ETag or Last-Modified validator"""
+        meta_path, body_path = self._paths(key)
+        body = response.content
+        headers = {k: v for k, v in response.headers.items() if k not in _DROPPED_HEADERS}
+        meta = {
+            "url": response.url,
+            "status": response.status_code,
+            "headers": headers,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "body_sha256": hashlib.sha256(body).hexdigest(),
+        }
+        with self._lock:
+            old_size = body_path.stat().st_size if body_path.exists() else 0
+            _replace_file(body_path, body)
+            _replace_file(meta_path, json.dumps(meta).encode())
+            self._size += len(body) - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Removes least recently used entries until the cache is under 90% of its cap"""
+        entries = sorted(self.folder.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for meta_path in entries:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            body_path = meta_path.with_suffix(".body")
+            try:
+                self._size -= body_path.stat().st_size
+                body_path.unlink()
+                meta_path.unlink()
+            except OSError:
+                continue
+
+    def _paths(self, key):
+        return self.folder / f"{key}.json", self.folder / f"{key}.body"
+
+
+class CanvasHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter with timeouts and shared rate limiting, answering unchanged GET requests from a ResponseCache
+
+    Args:
+        cache (ResponseCache or None): None disables caching
+        timeout (tuple): default (connect, read) timeout in seconds
+        **kwargs: passed to HTTPAdapter (pool_connections, pool_maxsize, ...)
+    """
+
+    def __init__(self, cache=None, timeout=None, **kwargs):
+        self.cache = cache
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        _count_connections(self.poolmanager)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        _count_connections(manager)
+        return manager
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+
+        if request.method != "GET":
+            return self._send(request, **kwargs)
+        if self.cache is None:
+            response = self._send(request, **kwargs)
+        else:
+            response = self._send_cached(request, **kwargs)
+        _record_validator(request, response)
+        _count_api_use(pages=1)
+        return response
+
+    def _send_cached(self, request, **kwargs):
+        key = _cache_key(request)
+        cached = self.cache.get(key)
+        if cached:
+            meta, _ = cached
+            if meta["etag"]:
+                request.headers["If-None-Match"] = meta["etag"]
+            if meta["last_modified"]:
+                request.headers["If-Modified-Since"] = meta["last_modified"]
+
+        response = self._send(request, **kwargs)
+
+        if response.status_code == 304 and cached:
+            _count_api_use(cache_hits=1)
+            # read the (empty) body so the connection goes back to the pool
+            response.content
+            return self._cached_response(request, response, *cached)
+        if response.status_code == 200 and (
+            response.headers.get("ETag") or response.headers.get("Last-Modified")
+        ):
+            self.cache.put(key, response)
+        return response
+
+    def _send(self, request, **kwargs):
+        return send_with_rate_limit(self._send_once, request, **kwargs)
+
+    def _send_once(self, request, **kwargs):
+        """Sends one attempt (rate limited retries are each counted)"""
+        response = super().send(request, **kwargs)
+        try:
+            size = int(response.headers["Content-Length"])
+        except (KeyError, ValueError):
+            size = 0 if kwargs.get("stream") else len(response.content)
+        try:
+            cost = float(response.headers.get("X-Request-Cost", 0))
+        except ValueError:
+            cost = 0.0
+        _count_api_use(requests=1, bytes=size, rate_limit_cost=cost)
+        return response
+
+    def _cached_response(self, request, not_modified, meta, body):
+        """Builds the full response for a 304 from the cached entry"""
+        response = Response()
+        response.status_code = meta["status"]
+        response.reason = "OK"
+        response.headers = CaseInsensitiveDict(meta["headers"])
+        # keep the fresh per-request headers (rate limits, dates) from the 304
+        for k, v in not_modified.headers.items():
+            if k not in _DROPPED_HEADERS:
+                response.headers[k] = v
+        response._content = body
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.elapsed = not_modified.elapsed
+        response.from_cache = True
+        return response
+
+
+def _replace_file(path, data):
+    """Writes data to a temporary file next to path, then moves it over path"""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _counting_connection_class(connection_class):
+    class CountingConnection(connection_class):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            _count_api_use(connections=1)
+    return CountingConnection
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _counting_connection_class(HTTPConnectionPool.ConnectionCls)
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _counting_connection_class(HTTPSConnectionPool.ConnectionCls)
+
+
+def _count_connections(manager):
+    """Makes the pools of a urllib3 PoolManager count the connections they open (see api_counters)"""
+    # leave custom pools (e.g. SOCKS proxies) alone
+    if manager.pool_classes_by_scheme is urllib3.poolmanager.pool_classes_by_scheme:
+        manager.pool_classes_by_scheme = {"http": _CountingHTTPConnectionPool, "https": _CountingHTTPSConnectionPool}
+
+
+def _cache_key(request):
+    """Returns a cache key for the URL (with parameters) and the credentials used"""
+    token = request.headers.get("Authorization", "")
+    token_digest = hashlib.sha256(token.encode()).hexdigest()
+    return hashlib.sha256(f"{request.method} {request.url} {token_digest}".encode()).hexdigest()
+
+
+_collectors = []
+_collectors_lock = threading.Lock()
+
+
+@contextmanager
+def collect_validators():
+    """Collects (url, validator) for every GET response received inside the block
+
+    The validator is the response's ETag, else its Last-Modified, else None
+    (also for anything but a 200, or a 304 answered from the cache).
+    Collection is process-wide, not per thread: pages fetched on a thread
+    pool are collected too, as are requests made by anything else running
+    at the same time.
+
+    Usage:
+        with collect_validators() as validators:
+            elements = fetch_all(paginated_list)
+    """
+    validators = []
+    with _collectors_lock:
+        _collectors.append(validators)
+    try:
+        yield validators
+    finally:
+        with _collectors_lock:
+            _collectors.remove(validators)
+
+
+def _record_validator(request, response):
+    if not _collectors:
+        return
+    validator = None
+    if response.status_code == 200:
+        validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+    with _collectors_lock:
+        for validators in _collectors:
+            validators.append((request.url, validator))
+
+
+_api_counters = {"requests": 0, "pages": 0, "bytes": 0, "rate_limit_cost": 0.0, "cache_hits": 0, "connections": 0}
+_api_counters_lock = threading.Lock()
+
+
+def api_counters():
+    """Returns the API use of this process so far
+
+    Returns:
+        dict: requests (sent over the network, retries included), pages
+            (GET responses handed to canvasapi), bytes (received, as sent
+            on the wire where Content-Length tells), rate_limit_cost (sum of
+            X-Request-Cost), cache_hits (304s answered from the cache) and
+            connections (opened to Canvas)
+    """
+    with _api_counters_lock:
+        return dict(_api_counters)
+
+
+def _count_api_use(**amounts):
+    with _api_counters_lock:
+        for name, amount in amounts.items():
+            _api_counters[name] += amount
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Returns the process-wide requests session used by every Canvas object
+
+    Built on first use from settings: connection pool size, timeouts and
+    the response cache (HTTP_CACHE_ENABLED).
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            cache = None
+            if settings.HTTP_CACHE_ENABLED:
+                cache = ResponseCache(settings.HTTP_CACHE_FOLDER, settings.HTTP_CACHE_MAX_MB * 2**20)
+            adapter = CanvasHTTPAdapter(
+                cache=cache,
+                timeout=(settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT),
+                pool_connections=4,
+                pool_maxsize=settings.HTTP_POOL_SIZE,
+                pool_block=True,
+            )
+            session = requests.Session()
+            session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def configure_canvas_session(canvas):
+    """Points a canvasapi Canvas object at the shared session from get_session
+
+    Args:
+        canvas (canvasapi.Canvas): Canvas object to configure
+
+    Returns:
+        canvasapi.Canvas: the same object
+    """
+    canvas._Canvas__requester._session = get_session()
+    return canvas
+
+
+def print_connection_stats():
+    """Prints the requests, connections (and how many were reused) and cache hits of this process"""
+    if _session is None:
+        return
+    stats = api_counters()
+    print(
+        f"HTTP: {stats['requests']} requests over {stats['connections']} connections "
+        f"({max(0, stats['requests'] - stats['connections'])} reused), {stats['cache_hits']} answered from cache"
+    )
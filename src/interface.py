@@ -21,9 +21,9 @@ from colorama import init
 init()
 
 from . import settings
+from .http_utils import configure_canvas_session
 from .logging_utils import log_failure
 from .utils import shut_down
-from .settings import COURSE_ID
 
 ### MODULE PROGRESS
 
@@ -36,9 +36,16 @@ from .settings import COURSE_ID
 # (not needed if not using pylint)
 
 
-def get_user_settings():
+def get_user_settings(use_entitlements=False, validate_courses=True):
     """Handles console printouts and collecting user input
 
+    Args:
+        use_entitlements (bool): read course ids from course_entitlements.csv
+                    instead of using COURSE_ID from .env
+        validate_courses (bool): get each course from Canvas here, dropping
+                    the ones that fail; when False the caller validates them
+                    (see get_course)
+
     Returns:
         dictionary: key-value pairs defining settings
                     (canvas obj., instance base_url,
@@ -53,13 +60,13 @@ def get_user_settings():
 
     """
     print("\n")
-    base_url = "https://canvas.ubc.ca"
+    base_url = os.getenv("API_URL", "https://canvas.ubc.ca")
 
     token = __load_token(base_url)
 
-    canvas = Canvas(base_url, token)
+    canvas = configure_canvas_session(Canvas(base_url, token))
     auth_header = {"Authorization": "Bearer " + token}
-    course_ids = [COURSE_ID] #__load_ids()
+    course_ids = __load_ids() if use_entitlements else [settings.COURSE_ID]
     courses = []
     valid_cids = []
     for cid in course_ids:
@@ -69,28 +76,23 @@ def get_user_settings():
             "status": "Not executed",
             "message": "Has not been run yet",
         }
-        try:
-            course = canvas.get_course(cid)
-        except InvalidAccessToken:
-            __shut_down(
-                "Invalid Access Token: Please check that the token provided is correct and still active"
-            )
-        except Unauthorized:
-            log_failure(cid, "User not authorized to get course data")
-        except TypeError:
-            log_failure(cid, 'Invalid type on course id: "' + str(cid) + '"')
-        except ResourceDoesNotExist:
-            log_failure(cid, "Not Found Error: Please ensure correct course id")
-        else:
+        if not validate_courses:
+            valid_cids.append(cid)
+            continue
+        course = get_course(canvas, cid)
+        if course is not None:
             courses.append(course)
             valid_cids.append(cid)
 
-    if not courses:
+    if not valid_cids:
         __shut_down(
             "Error: course_entitlements.csv must contain at least one valid course code"
         )
 
-    course_names = __make_selected_courses_string(courses)
+    if validate_courses:
+        course_names = __make_selected_courses_string(courses)
+    else:
+        course_names = "{} courses from course_entitlements.csv".format(len(valid_cids))
     
     # if not admin:
     # options = ["Yes, run for all courses", "Nevermind, end process"]
@@ -122,6 +124,34 @@ def get_user_settings():
     sys.exit()
 
 
+def get_course(canvas, cid, exit_on_error=True):
+    """Gets a course from Canvas, logging in settings.status why it could not
+
+    Args:
+        canvas (canvasapi.Canvas)
+        cid (int or str): course id
+        exit_on_error (bool): shut down on an invalid token (otherwise the
+            course is logged as failed)
+
+    Returns:
+        Course: the course, or None if it was logged as failed
+    """
+    try:
+        return canvas.get_course(cid)
+    except InvalidAccessToken:
+        msg = "Invalid Access Token: Please check that the token provided is correct and still active"
+        if exit_on_error:
+            __shut_down(msg)
+        log_failure(cid, msg)
+    except Unauthorized:
+        log_failure(cid, "User not authorized to get course data")
+    except TypeError:
+        log_failure(cid, 'Invalid type on course id: "' + str(cid) + '"')
+    except ResourceDoesNotExist:
+        log_failure(cid, "Not Found Error: Please ensure correct course id")
+    return None
+
+
 def render_status_table():
     """Prints status items to terminal in tabular format
 
@@ -232,8 +262,8 @@ def __read_token(url):
     """
     dotenv.load_dotenv(dotenv.find_dotenv(".env"))
 
-    if url == "https://canvas.ubc.ca":
-        token = os.environ.get("API_TOKEN")
+    # API_TOKEN belongs to the instance in API_URL
+    token = os.environ.get("API_TOKEN")
 
     # if url == 'https://ubc.test.instructure.com':
     #     token = os.environ.get('API_TOKEN_TEST')
@@ -0,0 +1,122 @@
+"""
+Runs Module Progress for every course in course_entitlements.csv, spreading
+the courses across a pool of processes.
+
+Each course runs in its own worker process with its own Canvas session and
+status entry, and results are collected as courses finish, so a slow or
+failing course only occupies its own worker. The combined student items
+table and status table are written with write_tableau_directory.
+
+Every worker has its own rate limiter, so RATE_LIMIT_MAX_CONCURRENCY applies
+per process; lower it when raising the number of processes. Courses are
+looked up in Canvas by the worker that runs them, not one by one up front,
+and share one response cache, data/<output_name>/http_cache (HTTP_CACHE).
+
+Usage:
+    python -m src.orchestrator [--processes N]
+"""
+
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from canvasapi import Canvas
+
+import src.interface as interface
+import src.settings as settings
+from src.file_utils import write_tableau_directory
+from src.http_utils import configure_canvas_session, print_connection_stats
+from src.logging_utils import log_failure
+from src.run_report import add_records, finish_run_report, take_records
+
+
+def run_all_courses(processes=None, max_workers=None, bulk=None, output_name="all_courses"):
+    """Runs Module Progress for all entitled courses in parallel processes
+
+    Args:
+        processes (int): courses run at the same time, defaults to
+            settings.ORCHESTRATOR_PROCESSES
+        max_workers (int): students fetched concurrently within a course,
+            defaults to settings.MODULE_PROGRESS_WORKERS
+        bulk (bool): defaults to settings.MODULE_PROGRESS_BULK
+        output_name (str): data/<output_name>/module_progress-Tableau receives
+            the combined output
+
+    Returns:
+        dict: settings.status for every course
+    """
+    if processes is None:
+        processes = settings.ORCHESTRATOR_PROCESSES
+    if max_workers is None:
+        max_workers = settings.MODULE_PROGRESS_WORKERS
+    if bulk is None:
+        bulk = settings.MODULE_PROGRESS_BULK
+
+    # one cache for every course, not the folder of the COURSE_ID in .env
+    settings.HTTP_CACHE_FOLDER = f"data/{output_name}/http_cache"
+    usr_settings = interface.get_user_settings(use_entitlements=True, validate_courses=False)
+    course_ids = usr_settings["course_ids"]
+    tableau_dfs = []
+
+    print(f"Running {len(course_ids)} courses on {processes} processes ...")
+    # spawn (not fork) so workers never share the parent's connections or locks
+    context = multiprocessing.get_context("spawn")
+    overrides = settings.resolved()
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                             initializer=_init_worker, initargs=(overrides,)) as executor:
+        futures = {
+            executor.submit(
+                _run_course, usr_settings["base_url"], usr_settings["token"], cid,
+                settings.status[str(cid)], max_workers, bulk,
+            ): cid
+            for cid in course_ids
+        }
+        for future in as_completed(futures):
+            cid = futures[future]
+            try:
+                status, student_items_status, report = future.result()
+            except Exception as e:
+                log_failure(cid, "Worker failed: " + str(e))
+                continue
+            settings.status[str(cid)] = status
+            add_records(report)
+            if student_items_status is not None:
+                tableau_dfs.append(student_items_status)
+            print(f"{cid}: {status['status']}")
+
+    if tableau_dfs:
+        write_tableau_directory(output_name, tableau_dfs)
+    interface.render_status_table()
+    return settings.status
+
+
+def _init_worker(overrides):
+    """Applies the parent's settings (including command line overrides) in a worker"""
+    for k, v in overrides.items():
+        setattr(settings, k, v)
+
+
+def _run_course(base_url, token, cid, status, max_workers, bulk):
+    """Worker: runs one course and returns (status entry, student items DataFrame or None, run report records)"""
+    from src.RUN_MODULE_PROGRESS import run_course
+
+    settings.status[str(cid)] = dict(status)
+    # the worker may have run other courses before, keep only this one's records
+    take_records()
+    canvas = configure_canvas_session(Canvas(base_url, token))
+    try:
+        student_items_status = run_course(canvas, cid, max_workers=max_workers, bulk=bulk, exit_on_error=False)
+    except Exception as e:
+        log_failure(cid, "Unexpected error: " + str(e))
+        student_items_status = None
+    print_connection_stats()
+    return settings.status[str(cid)], student_items_status, take_records()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=None,
+                        help="courses run at the same time (default: ORCHESTRATOR_PROCESSES or 4)")
+    args = parser.parse_args()
+    run_all_courses(processes=args.processes)
+    finish_run_report("data/all_courses/module_progress-Tableau")
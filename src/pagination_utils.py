@@ -0,0 +1,203 @@
+"""
+Asyncio pagination helpers for canvasapi PaginatedList objects.
+
+canvasapi requests one page at a time and only asks for the next page once
+the current one has been consumed. These helpers keep up to max_in_flight
+page requests running on a thread pool while earlier pages are decoded:
+
+- when the Link header gives a numbered "last" page, every remaining page
+  is requested up front (bounded by the pool size)
+- otherwise the "next" page is requested as soon as the current page's
+  headers arrive, before its body is decoded
+
+Elements are built exactly like PaginatedList builds them, in page order.
+This relies on PaginatedList and Requester internals as of canvasapi 3.x;
+when they are missing the lists are simply iterated.
+"""
+
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from canvasapi.paginated_list import PaginatedList
+
+PAGE_PARAM = re.compile(r"([?&])page=(\d+)")
+
+# PaginatedList and Requester internals used below (canvasapi 3.x)
+PAGINATED_LIST_ATTRIBUTES = ("_elements", "_first_url", "_next_url", "_first_params", "_request_method",
+                             "_url_override", "_root", "_extra_attribs", "_content_class", "_requester")
+REQUESTER_ATTRIBUTES = ("base_url", "new_quizzes_url")
+
+
+def fetch_all(paginated_list, max_in_flight=4):
+    """Returns every element of a PaginatedList
+
+    Args:
+        paginated_list (PaginatedList or iterable): list to fetch, anything
+            that is not an untouched PaginatedList is simply iterated
+        max_in_flight (int): maximum concurrent page requests
+
+    Returns:
+        list: elements in the same order as iterating the PaginatedList
+    """
+    if not _is_fresh(paginated_list):
+        return list(paginated_list)
+    return asyncio.run(_fetch_lists([paginated_list], max_in_flight))[0]
+
+
+def fetch_all_nested(paginated_list, iteration_call, max_in_flight=4):
+    """Returns the children of every element of a PaginatedList
+
+    Equivalent to calling getattr(element, iteration_call)() on each element
+    and iterating the result, but the child lists are fetched concurrently.
+
+    Args:
+        paginated_list (PaginatedList or iterable): parent list
+        iteration_call (str): method on each parent returning a PaginatedList
+        max_in_flight (int): maximum concurrent page requests
+
+    Returns:
+        list: children, grouped by parent in parent order
+    """
+    parents = fetch_all(paginated_list, max_in_flight)
+    children = [getattr(parent, iteration_call)() for parent in parents]
+    return [child for c in fetch_lists(children, max_in_flight) for child in c]
+
+
+def fetch_lists(paginated_lists, max_in_flight=4):
+    """Returns the elements of several PaginatedLists, fetched concurrently
+
+    Args:
+        paginated_lists (list of PaginatedList)
+        max_in_flight (int): maximum concurrent page requests across all lists
+
+    Returns:
+        list of list: elements of each list, in the order given
+    """
+    if not all(_is_fresh(pl) for pl in paginated_lists):
+        return [list(pl) for pl in paginated_lists]
+    if not paginated_lists:
+        return []
+    return asyncio.run(_fetch_lists(paginated_lists, max_in_flight))
+
+
+def _is_fresh(paginated_list):
+    """True for a PaginatedList that has not been iterated yet, from a canvasapi these helpers support"""
+    return (isinstance(paginated_list, PaginatedList)
+            and all(hasattr(paginated_list, a) for a in PAGINATED_LIST_ATTRIBUTES)
+            and all(hasattr(paginated_list._requester, a) for a in REQUESTER_ATTRIBUTES)
+            and not paginated_list._elements
+            and paginated_list._next_url == paginated_list._first_url)
+
+
+async def _fetch_lists(paginated_lists, max_in_flight):
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight or 1)) as executor:
+        return await asyncio.gather(
+            *[_fetch_list(pl, loop, executor) for pl in paginated_lists]
+        )
+
+
+async def _fetch_list(pl, loop, executor):
+    def request(url, params):
+        return pl._requester.request(pl._request_method, url, _url=pl._url_override, **params)
+
+    first_params = dict(pl._first_params)
+    if "_kwargs" in first_params:
+        # Requester.request extends _kwargs in place, never hand it the original
+        first_params["_kwargs"] = list(first_params["_kwargs"])
+
+    response = await loop.run_in_executor(executor, partial(request, pl._first_url, first_params))
+    elements = []
+
+    next_url = _next_endpoint(pl, response)
+    page_urls = _numbered_page_endpoints(pl, response, next_url)
+    if page_urls:
+        pending = [loop.run_in_executor(executor, partial(request, url, {})) for url in page_urls]
+        elements += _decode_page(pl, response)
+        for page in pending:
+            elements += _decode_page(pl, await page)
+        return elements
+
+    while True:
+        if next_url:
+            pending = loop.run_in_executor(executor, partial(request, next_url, {}))
+            elements += _decode_page(pl, response)
+            response = await pending
+            next_url = _next_endpoint(pl, response)
+        else:
+            data = response.json()
+            # like PaginatedList, a meta property only counts when there are no Link headers
+            next_url = None if response.links else _meta_next_endpoint(pl, data)
+            elements += _decode_page(pl, response, data)
+            if not next_url:
+                return elements
+            response = await loop.run_in_executor(executor, partial(request, next_url, {}))
+            next_url = _next_endpoint(pl, response)
+
+
+def _strip_base_url(pl, url):
+    regex = r"(?:{}|{})(.*)".format(
+        re.escape(pl._requester.base_url),
+        re.escape(pl._requester.new_quizzes_url),
+    )
+    return re.search(regex, url).group(1)
+
+
+def _next_endpoint(pl, response):
+    """Returns the next page endpoint from the Link header (None if absent)"""
+    next_link = response.links.get("next") if response.links else None
+    return _strip_base_url(pl, next_link["url"]) if next_link else None
+
+
+def _meta_next_endpoint(pl, data):
+    """Returns the next page endpoint for responses paginated through a meta property"""
+    if isinstance(data, dict) and "meta" in data:
+        try:
+            return _strip_base_url(pl, data["meta"]["pagination"]["next"])
+        except (KeyError, TypeError, AttributeError):
+            return None
+    return None
+
+
+def _numbered_page_endpoints(pl, response, next_url):
+    """Returns endpoints for every remaining page when the Link header allows it
+
+    Canvas only includes a "last" link when it knows the page count, and some
+    endpoints page with opaque bookmarks instead of numbers; both cases
+    return None and the caller follows "next" links instead.
+    """
+    last_link = response.links.get("last") if response.links else None
+    if not next_url or not last_link:
+        return None
+    next_match = PAGE_PARAM.search(next_url)
+    last_match = PAGE_PARAM.search(last_link["url"])
+    if not next_match or not last_match:
+        return None
+    first_page, last_page = int(next_match.group(2)), int(last_match.group(2))
+    return [
+        PAGE_PARAM.sub(lambda m: f"{m.group(1)}page={page}", next_url, count=1)
+        for page in range(first_page, last_page + 1)
+    ]
+
+
+def _decode_page(pl, response, data=None):
+    """Builds content_class elements from a page, as PaginatedList._get_next_page does"""
+    if data is None:
+        data = response.json()
+
+    if pl._root:
+        try:
+            data = data[pl._root]
+        except KeyError:
+            raise ValueError(
+                "The key <{}> does not exist in the response.".format(pl._root)
+            )
+
+    content = []
+    for element in data:
+        if element is not None:
+            element.update(pl._extra_attribs)
+            content.append(pl._content_class(pl._requester, element))
+    return content
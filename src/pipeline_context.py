@@ -0,0 +1,109 @@
+"""
+In-memory handoff of datasets between the course details stages.
+
+create_course_data, transform_course_data and transform_course_data_for_tableau
+pass their datasets to each other through files in original_data and
+cleaned_data. A PipelineContext sits in front of storage.py: every dataset is
+still written to disk (the files stay the audit trail and the input for
+later runs), but a copy is kept in memory so the next stage does not parse it
+again. Frames that would take the context over its memory limit are only
+kept on disk and read back when asked for.
+
+The context also carries the run's StageCache (see stage_cache.py), so the
+stages can skip work whose inputs have not changed.
+"""
+
+import sys
+import threading
+
+import pandas as pd
+
+from . import settings
+from .stage_cache import StageCache
+from .storage import read_dataset, write_dataset
+
+
+class PipelineContext:
+    """Write-through, in-memory cache of the datasets of one pipeline run
+
+    Args:
+        memory_limit_mb (float): memory the cached frames may take, defaults
+            to settings.PIPELINE_MEMORY_LIMIT_MB. 0 keeps nothing in memory.
+        stages (StageCache): skips unchanged stages, defaults to running every stage
+    """
+
+    def __init__(self, memory_limit_mb=None, stages=None):
+        if memory_limit_mb is None:
+            memory_limit_mb = settings.PIPELINE_MEMORY_LIMIT_MB
+        self.memory_limit = memory_limit_mb * 2**20
+        self.memory_used = 0
+        self.spilled = set()
+        self.stages = stages or StageCache()
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def write(self, dataframe, folder, name):
+        """Writes a dataset with storage.write_dataset and keeps it for later stages
+
+        Returns:
+            str: path written
+        """
+        path = write_dataset(dataframe, folder, name)
+        if self.memory_limit <= 0:
+            return path
+        if not dataframe.index.equals(pd.RangeIndex(len(dataframe))):
+            # match what reading the dataset back would give
+            dataframe = dataframe.reset_index(drop=True)
+        size = _estimate_bytes(dataframe)
+        key = (folder, name)
+        with self._lock:
+            self._discard(key)
+            if self.memory_used + size <= self.memory_limit:
+                self._frames[key] = (dataframe, size)
+                self.memory_used += size
+            else:
+                self.spilled.add(key)
+        return path
+
+    def read(self, folder, name, columns=None):
+        """Returns a dataset, from memory when this run produced it, otherwise from disk
+
+        The frame returned is a shallow copy: adding, replacing or renaming
+        columns does not change the cached frame.
+
+        Args:
+            folder (str)
+            name (str): dataset name, without extension
+            columns (list of str): only return these columns
+        """
+        with self._lock:
+            cached = self._frames.get((folder, name))
+        if cached is None:
+            return read_dataset(folder, name, columns=columns)
+        dataframe = cached[0]
+        if columns is not None:
+            return dataframe[columns].copy(deep=False)
+        return dataframe.copy(deep=False)
+
+    def clear(self):
+        """Drops every cached frame (the datasets on disk are kept)"""
+        with self._lock:
+            self._frames.clear()
+            self.memory_used = 0
+
+    def _discard(self, key):
+        cached = self._frames.pop(key, None)
+        if cached is not None:
+            self.memory_used -= cached[1]
+        self.spilled.discard(key)
+
+
+def _estimate_bytes(dataframe, sample_size=1000):
+    """Estimates a frame's memory, sizing Python objects from a sample instead of every value"""
+    size = int(dataframe.memory_usage(deep=False).sum())
+    for col in dataframe.columns[dataframe.dtypes == object]:
+        values = dataframe[col]
+        if len(values):
+            sample = values.sample(min(sample_size, len(values)), random_state=0)
+            size += int(sum(sys.getsizeof(v) for v in sample) / len(sample) * len(values))
+    return size
@@ -0,0 +1,223 @@
+"""
+Profiling of a whole run (--profile) or of single stages (--profile-stage).
+
+profile(name) runs its block under three tools at once and writes their
+reports to settings.DATA_FOLDER/profiles, as <name>-<time>-<pid>.*:
+
+- .prof, .cumulative.txt, .tottime.txt: cProfile stats of
+  the block (pstats file, and per-function tables sorted by cumulative and
+  own time). Threads started inside the block are profiled too, each with
+  its own profiler; those still running when the block ends (e.g. daemon
+  threads) are only in the stack samples.
+- .allocations.txt: tracemalloc peak and the lines and files that
+  hold the most memory when the block ends.
+- .collapsed.txt: stacks of every thread sampled every SAMPLE_INTERVAL
+  seconds (wall clock, waiting included), one "frame;frame;... count" line
+  per stack, as read by flamegraph.pl, speedscope or inferno.
+
+Functions decorated with stage(name) run under profile(name) when name is
+in settings.PROFILE_STAGES. Profiles do not nest: a stage reached while a
+profile is already running is only part of that profile.
+
+Profiling slows the run down (tracemalloc most of all): use it to find
+where the time and memory go, not to time a run.
+"""
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+from . import settings
+from .utils import print_success
+
+# seconds between stack samples
+SAMPLE_INTERVAL = 0.01
+# rows of the per-function and allocation tables
+REPORT_LIMIT = 60
+
+# functions decorated with stage, the choices for --profile-stage
+STAGES = ["get_student_module_status", "get_student_items_status", "create_course_data",
+          "check_for_user_input_files", "transform_course_data", "transform_course_data_for_tableau"]
+
+_running = threading.Lock()
+
+
+@contextmanager
+def profile(name, folder=None, memory=True):
+    """Profiles the block and writes the reports described above
+
+    Args:
+        name (str): file name prefix, e.g. "run" or "get_student_module_status"
+        folder (str): defaults to settings.DATA_FOLDER/profiles
+        memory (bool): trace allocations with tracemalloc
+
+    Yields:
+        bool: False if another profile was already running (nothing is profiled)
+    """
+    if not _running.acquire(blocking=False):
+        yield False
+        return
+
+    main_profiler = cProfile.Profile()
+    thread_profilers = []
+    sampler = _StackSampler()
+    started_tracing = memory and not tracemalloc.is_tracing()
+    try:
+        if started_tracing:
+            tracemalloc.start()
+        sampler.start()
+        threading.setprofile(functools.partial(_profile_new_thread, thread_profilers))
+        main_profiler.enable()
+        try:
+            yield True
+        finally:
+            main_profiler.disable()
+            threading.setprofile(None)
+            sampler.stop()
+            allocations = _allocation_report() if memory and tracemalloc.is_tracing() else None
+            if started_tracing:
+                tracemalloc.stop()
+            finished = [p for thread, p in thread_profilers if not thread.is_alive()]
+            paths = _write_reports(name, folder, [main_profiler] + finished, allocations, sampler.stacks)
+            print_success(f"Profile of {name}: {', '.join(str(p) for p in paths)}")
+    finally:
+        _running.release()
+
+
+def stage(name):
+    """Decorator: runs the function under profile(name) when name is in settings.PROFILE_STAGES"""
+    if name not in STAGES:
+        raise ValueError(f"Add {name} to profiling.STAGES")
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if name not in settings.PROFILE_STAGES:
+                return func(*args, **kwargs)
+            with profile(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_arguments(parser, default=None):
+    """Adds --profile and --profile-stage to an entry point's argparse parser
+
+    Args:
+        parser (argparse.ArgumentParser): parser or subcommand parser
+        default: default of both options, e.g. argparse.SUPPRESS; None for False and []
+    """
+    parser.add_argument("--profile", action="store_true", default=False if default is None else default,
+                        help="profile the whole run (CPU, allocations, stack samples) into data/COURSE_ID/profiles")
+    parser.add_argument("--profile-stage", nargs="+", choices=STAGES, default=[] if default is None else default,
+                        metavar="STAGE",
+                        help=f"profile these stages each time they run, one of: {', '.join(STAGES)}")
+
+
+def from_arguments(args, name):
+    """Applies --profile-stage and returns profile(name) for --profile, a no-op context otherwise"""
+    if args.profile_stage:
+        settings.PROFILE_STAGES = args.profile_stage
+    return profile(name) if args.profile else nullcontext()
+
+
+def _profile_new_thread(thread_profilers, *_):
+    """threading.setprofile hook: gives a thread started during the profile its own profiler"""
+    profiler = cProfile.Profile()
+    try:
+        # replaces this hook for the rest of the thread
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+: one profiler at a time, and the main one already sees every thread
+        return
+    thread_profilers.append((threading.current_thread(), profiler))
+
+
+def _allocation_report():
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    current, peak = tracemalloc.get_traced_memory()
+    out = io.StringIO()
+    out.write(f"traced memory: {current / 2**20:.1f} MiB at the end, {peak / 2**20:.1f} MiB peak\n")
+    for key_type in ["lineno", "filename"]:
+        stats = snapshot.statistics(key_type)
+        out.write(f"\nby {key_type}, {len(stats)} total, largest first:\n")
+        for stat in stats[:REPORT_LIMIT]:
+            out.write(f"{stat.size / 2**20:10.2f} MiB {stat.count:10} blocks  {stat.traceback[0]}\n")
+    return out.getvalue()
+
+
+def _write_reports(name, folder, profilers, allocations, stacks):
+    """Writes the reports and returns their paths"""
+    folder = Path(folder or f"{settings.DATA_FOLDER}/profiles")
+    folder.mkdir(parents=True, exist_ok=True)
+    # several processes (orchestrator workers) may profile the same stage
+    prefix = folder / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    paths = []
+
+    stats = pstats.Stats(profilers[0])
+    for profiler in profilers[1:]:
+        stats.add(profiler)
+    stats.dump_stats(f"{prefix}.prof")
+    paths.append(Path(f"{prefix}.prof"))
+    for sort in ["cumulative", "tottime"]:
+        path = Path(f"{prefix}.{sort}.txt")
+        with open(path, "w") as f:
+            stats.stream = f
+            stats.sort_stats(sort).print_stats(REPORT_LIMIT)
+        paths.append(path)
+
+    if allocations is not None:
+        path = Path(f"{prefix}.allocations.txt")
+        path.write_text(allocations)
+        paths.append(path)
+
+    path = Path(f"{prefix}.collapsed.txt")
+    with open(path, "w") as f:
+        for stack, count in sorted(stacks.items()):
+            f.write(f"{stack} {count}\n")
+    paths.append(path)
+    return paths
+
+
+class _StackSampler:
+    """Daemon thread counting the stacks of every other thread (collapsed, root first)"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(frames))] += 1
@@ -0,0 +1,142 @@
+"""
+Process-wide rate limiting for Canvas API requests.
+
+Canvas throttles each token with a leaky bucket: every response reports the
+bucket's X-Rate-Limit-Remaining and the X-Request-Cost of the request, and
+once the bucket is empty requests fail with 403 "Rate Limit Exceeded" (429
+on some instances). The shared RateLimiter (get_rate_limiter) caps how
+many requests are in flight across every thread, shrinks that cap and paces
+requests as the bucket runs low, grows it back while there is headroom, and
+retries throttled requests with jittered exponential backoff.
+"""
+
+import random
+import threading
+import time
+
+from . import settings
+
+
+class RateLimiter:
+    """Adaptive concurrency limit driven by Canvas throttling headers
+
+    Args:
+        max_concurrency (int): upper bound for requests in flight
+        low_water (float): remaining quota below which the limiter backs off
+        max_retries (int): retries for a throttled request
+        leak_rate (float): quota units Canvas restores per second, used to
+            pace requests while below low_water
+    """
+
+    def __init__(self, max_concurrency=16, low_water=300, max_retries=5, leak_rate=10):
+        self.max_concurrency = max_concurrency
+        self.low_water = low_water
+        self.max_retries = max_retries
+        self.leak_rate = leak_rate
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self.remaining = None
+        self.throttled_count = 0
+        self._pause_until = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Blocks until a request may be sent"""
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+            pause = self._pause_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+
+    def release(self, response=None):
+        """Frees the slot taken by acquire and adapts to the response headers"""
+        with self._cond:
+            self.in_flight -= 1
+            if response is not None:
+                self._update(response.headers)
+            self._cond.notify_all()
+
+    def backoff(self, attempt):
+        """Drops to one request in flight and waits before retrying a throttled request"""
+        delay = min(60.0, 2 ** attempt) * random.uniform(0.5, 1.5)
+        with self._cond:
+            self.throttled_count += 1
+            self.limit = 1
+            self._pause_until = max(self._pause_until, time.monotonic() + delay)
+        time.sleep(delay)
+
+    def _update(self, headers):
+        try:
+            remaining = float(headers["X-Rate-Limit-Remaining"])
+        except (KeyError, ValueError):
+            return
+        try:
+            cost = float(headers.get("X-Request-Cost", 0))
+        except ValueError:
+            cost = 0.0
+        self.remaining = remaining
+
+        if remaining < self.low_water:
+            # multiplicative decrease, and wait for the bucket to drain what this request cost
+            self.limit = max(1, self.limit // 2)
+            self._pause_until = max(self._pause_until, time.monotonic() + cost / self.leak_rate)
+        elif remaining > 2 * self.low_water and self.limit < self.max_concurrency:
+            self.limit += 1
+
+
+def is_throttled(response):
+    """True if Canvas rejected the request for exceeding the rate limit"""
+    if response.status_code == 429:
+        return True
+    return response.status_code == 403 and b"Rate Limit Exceeded" in response.content
+
+
+def send_with_rate_limit(send, request, limiter=None, **kwargs):
+    """Sends a request through limiter, retrying while Canvas throttles it
+
+    Args:
+        send (callable): the underlying send, i.e. HTTPAdapter.send
+        request (PreparedRequest)
+        limiter (RateLimiter): defaults to the process-wide one from get_rate_limiter
+
+    Returns:
+        Response: the first response that was not throttled, or the last one
+    """
+    limiter = limiter or get_rate_limiter()
+    attempt = 0
+    while True:
+        limiter.acquire()
+        response = None
+        try:
+            response = send(request, **kwargs)
+        finally:
+            limiter.release(response)
+        if not is_throttled(response) or attempt >= limiter.max_retries:
+            return response
+        # read the body so the connection goes back to the pool before retrying
+        response.content
+        limiter.backoff(attempt)
+        attempt += 1
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Returns the process-wide RateLimiter shared by every thread
+
+    Built on first use from settings (RATE_LIMIT_*), so importing this
+    module does not read .env.
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(
+                max_concurrency=settings.RATE_LIMIT_MAX_CONCURRENCY,
+                low_water=settings.RATE_LIMIT_LOW_WATER,
+                max_retries=settings.RATE_LIMIT_MAX_RETRIES,
+            )
+        return _rate_limiter
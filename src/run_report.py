@@ -0,0 +1,232 @@
+"""
+Per-course, per-stage measurements of a run, written next to status.csv.
+
+Each step the entry points run is wrapped in measure(course_id, stage),
+which records its wall and CPU time, the peak memory (RSS) of the process
+while it ran, the rows it produced and the Canvas API use (requests, pages,
+bytes, rate limit cost, see http_utils.api_counters). write_run_report
+writes them to run_report.json and run_report.csv, print_run_summary prints
+the courses and stages that took longest; finish_run_report does both at
+the end of a run.
+
+CPU time, memory and API use are measured for the whole process: stages
+running at the same time (threads) are each charged for all of it.
+Workers of orchestrator.py measure in their own process and send their
+records back with take_records / add_records.
+"""
+
+import csv
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from prettytable import PrettyTable
+
+from .http_utils import api_counters
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+FIELDS = ["course_id", "stage", "status", "started_at", "wall_seconds", "cpu_seconds", "peak_rss_mb", "rows",
+          "requests", "pages", "bytes", "rate_limit_cost", "cache_hits"]
+# seconds between samples of the process memory
+SAMPLE_INTERVAL = 0.05
+
+_records = []
+_records_lock = threading.Lock()
+_active = []
+
+
+@contextmanager
+def measure(course_id, stage):
+    """Measures the block as one stage of the run report
+
+    Rows are counted with record_rows, by the block or by what it calls
+    (storage.py counts the rows of every dataset it writes). A block that
+    raises is recorded with status "failed" and the exception propagates.
+
+    Args:
+        course_id (int or str)
+        stage (str): e.g. "module_progress/student_items_status"
+
+    Usage:
+        with measure(cid, "module_progress/write"):
+            write_data_directory(dataframes, cid)
+    """
+    record = {"course_id": str(course_id), "stage": stage, "status": "ok", "rows": 0,
+              "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+              "peak_rss": _current_rss()}
+    api_before = api_counters()
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+    with _records_lock:
+        _active.append(record)
+    _sampler.start()
+    try:
+        yield record
+    except BaseException:
+        record["status"] = "failed"
+        raise
+    finally:
+        wall = time.perf_counter() - wall_before
+        cpu = time.process_time() - cpu_before
+        api_after = api_counters()
+        with _records_lock:
+            _active.remove(record)
+            peak = max(record.pop("peak_rss"), _current_rss())
+            record.update(wall_seconds=round(wall, 3), cpu_seconds=round(cpu, 3),
+                          peak_rss_mb=round(peak / 2**20, 1))
+            record.update({k: api_after[k] - api_before[k] for k in api_after})
+            record["rate_limit_cost"] = round(record["rate_limit_cost"], 3)
+            _records.append({k: record[k] for k in FIELDS})
+
+
+def record_rows(count):
+    """Adds count to the rows of every stage being measured"""
+    with _records_lock:
+        for record in _active:
+            record["rows"] += count
+
+
+def records():
+    """Returns a copy of the records of this process"""
+    with _records_lock:
+        return [dict(r) for r in _records]
+
+
+def take_records():
+    """Returns the records of this process and forgets them"""
+    with _records_lock:
+        taken = list(_records)
+        _records.clear()
+    return taken
+
+
+def add_records(new_records):
+    """Adds records measured elsewhere (e.g. in a worker process)"""
+    with _records_lock:
+        _records.extend(new_records)
+
+
+def write_run_report(folder):
+    """Writes the records to folder/run_report.json and folder/run_report.csv
+
+    Returns:
+        tuple of Path: json and csv paths, None if nothing was measured
+    """
+    report = records()
+    if not report:
+        return None
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    json_path = folder / "run_report.json"
+    csv_path = folder / "run_report.csv"
+    with open(json_path, "w") as f:
+        json.dump({"generated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+                   "courses": summarize_courses(report), "stages": report}, f, indent=2)
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(report)
+    return json_path, csv_path
+
+
+def finish_run_report(folder):
+    """Writes the run report to folder and prints the summary"""
+    paths = write_run_report(folder)
+    if paths:
+        print(f"Run report: {paths[0]}, {paths[1]}")
+    print_run_summary()
+
+
+def summarize_courses(report):
+    """Returns one total per course: summed times, rows and API use, the highest peak memory"""
+    courses = {}
+    for r in report:
+        total = courses.setdefault(r["course_id"], {
+            "course_id": r["course_id"], "stages": 0, "failed": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+            "peak_rss_mb": 0.0, "rows": 0, "requests": 0, "pages": 0, "bytes": 0, "rate_limit_cost": 0.0,
+            "cache_hits": 0,
+        })
+        total["stages"] += 1
+        total["failed"] += r["status"] == "failed"
+        total["peak_rss_mb"] = max(total["peak_rss_mb"], r["peak_rss_mb"])
+        for k in ["wall_seconds", "cpu_seconds", "rows", "requests", "pages", "bytes", "rate_limit_cost",
+                  "cache_hits"]:
+            total[k] += r[k]
+    for total in courses.values():
+        for k in ["wall_seconds", "cpu_seconds", "rate_limit_cost"]:
+            total[k] = round(total[k], 3)
+    return sorted(courses.values(), key=lambda c: c["wall_seconds"], reverse=True)
+
+
+def print_run_summary(top=10):
+    """Prints the courses, then the top slowest stages, by wall time"""
+    report = records()
+    if not report:
+        return
+    columns = ["wall s", "cpu s", "peak MiB", "rows", "requests", "pages", "MiB in", "cost"]
+
+    def values(r):
+        return [f"{r['wall_seconds']:.1f}", f"{r['cpu_seconds']:.1f}", f"{r['peak_rss_mb']:.0f}", r["rows"],
+                r["requests"], r["pages"], f"{r['bytes'] / 2**20:.1f}", f"{r['rate_limit_cost']:.0f}"]
+
+    courses = PrettyTable()
+    courses.field_names = ["Course Id", "Stages"] + columns
+    for total in summarize_courses(report):
+        stages = f"{total['stages']}" + (f" ({total['failed']} failed)" if total["failed"] else "")
+        courses.add_row([total["course_id"], stages] + values(total))
+    print(courses)
+
+    stages = PrettyTable()
+    stages.field_names = ["Course Id", "Stage"] + columns
+    for r in sorted(report, key=lambda r: r["wall_seconds"], reverse=True)[:top]:
+        stage = r["stage"] + (" (failed)" if r["status"] == "failed" else "")
+        stages.add_row([r["course_id"], stage] + values(r))
+    print(stages)
+
+
+def _current_rss():
+    """Returns the resident memory of the process in bytes (its peak so far where /proc is missing)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _MemorySampler:
+    """Daemon thread raising the peak memory of the stages being measured"""
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="run-report-memory", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(SAMPLE_INTERVAL)
+            rss = _current_rss()
+            with _records_lock:
+                for record in _active:
+                    record["peak_rss"] = max(record["peak_rss"], rss)
+
+
+_sampler = _MemorySampler()
@@ -0,0 +1,91 @@
+"""
+Status of the last runs, read from the files they leave behind.
+
+python3 -m run status prints, for the course in .env (if COURSE_ID is set):
+- when each course details stage last completed (stage_manifest.json)
+- each stage of the last run with its time, memory, rows and Canvas requests (run_report.csv)
+and, after a run over all courses, the status of each course (status.csv).
+
+Uses the standard library only, so it answers without loading pandas or contacting Canvas.
+"""
+
+import csv
+import json
+import os
+from pathlib import Path
+
+from . import settings
+from .utils import print_success, print_unexpected
+
+ALL_COURSES_FOLDER = "data/all_courses/module_progress-Tableau"
+
+# run_report.csv columns shown, with their headings
+REPORT_COLUMNS = [("stage", "stage"), ("status", "status"), ("started_at", "started"), ("wall_seconds", "wall s"),
+                  ("cpu_seconds", "cpu s"), ("peak_rss_mb", "peak MB"), ("rows", "rows"), ("requests", "requests")]
+
+
+def print_status(data_folder=None, all_courses_folder=ALL_COURSES_FOLDER):
+    """Prints the status of the last runs
+
+    Args:
+        data_folder (str): defaults to settings.DATA_FOLDER, or only the
+            all courses status when COURSE_ID is not set
+        all_courses_folder (str): output folder of the run over all courses
+    """
+    if data_folder is None:
+        # settings.COURSE_ID would shut down without one
+        settings.load_env()
+        if os.getenv("COURSE_ID"):
+            data_folder = settings.DATA_FOLDER
+    found = False
+
+    if data_folder is not None:
+        found = _print_course_status(Path(data_folder))
+
+    status = Path(all_courses_folder) / "status.csv"
+    if status.exists():
+        found = True
+        with open(status, newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            rows = list(reader)
+        print(f"\nAll courses ({status}):")
+        _print_table(header, rows)
+
+    if not found:
+        print("\nNo runs yet: python3 -m run")
+
+
+def _print_course_status(data_folder):
+    """Prints the stages and last run of the course in data_folder, returns False if it has neither"""
+    print(f"Course {data_folder.name} ({data_folder})")
+    found = False
+
+    manifest = data_folder / "stage_manifest.json"
+    if manifest.exists():
+        found = True
+        stages = json.loads(manifest.read_text()).get("stages", {})
+        print("\nCourse details stages:")
+        _print_table(["stage", "completed"], [[name, entry.get("completed_at", "")]
+                                              for name, entry in sorted(stages.items())])
+
+    report = data_folder / "run_report.csv"
+    if report.exists():
+        found = True
+        with open(report, newline="") as f:
+            rows = list(csv.DictReader(f))
+        failed = [row["stage"] for row in rows if row["status"] != "ok"]
+        print("\nLast run:")
+        _print_table([heading for _, heading in REPORT_COLUMNS],
+                     [[row.get(column, "") for column, _ in REPORT_COLUMNS] for row in rows])
+        if failed:
+            print_unexpected(f"Failed: {', '.join(failed)}")
+        else:
+            print_success(f"{len(rows)} stages ok, {sum(float(row['wall_seconds']) for row in rows):.1f} s")
+    return found
+
+
+def _print_table(header, rows):
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print("  " + "  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip())
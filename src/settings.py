@@ -1,34 +1,136 @@
-from dotenv import load_dotenv
-from .environment_variables import get_course_id
-# import os
+"""
+Settings read from the environment and .env, each resolved on first use.
+
+Importing this module reads nothing: .env is loaded and COURSE_ID (which
+shuts down when it is missing) is looked up the first time a setting is
+accessed (module __getattr__, PEP 562), so commands that don't need them
+start quickly. A setting keeps its first value; assigning it (e.g. from a
+command line option) before or after that replaces it.
+"""
 
-load_dotenv()
-COURSE_ID = get_course_id()
+import os
+
+from .environment_variables import get_course_id
 
-## MODULE PROGRESS 
+## MODULE PROGRESS
 ## TODO IS THIS BROKEN? OR NEEDED?
 
 status = {}
-# ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 INST_CODE = 112240000000000000 # WORKS FOR UBC
-# project structure folders 
-DATA_FOLDER = f'data/{COURSE_ID}'
+# ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_dotenv_loaded = False
+
+
+def load_env():
+    """Loads .env into the environment (once)"""
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _dotenv_loaded = True
+
+
+def _flag(name, default):
+    return os.getenv(name, default).lower() in ('true', '1', 'yes')
+
+
+def _data_folder(path=''):
+    return lambda: f'data/{_get("COURSE_ID")}{path}'
+
+
+# name -> function returning the setting, called on first use
+_SETTINGS = {
+    'COURSE_ID': get_course_id,
+
+    # number of students whose module progress is requested at the same time
+    'MODULE_PROGRESS_WORKERS': lambda: int(os.getenv('MODULE_PROGRESS_WORKERS', 1)),
+    # skip the per-student request of students with no completed requirements (course-wide progress summary)
+    'MODULE_PROGRESS_BULK': lambda: _flag('MODULE_PROGRESS_BULK', 'False'),
+    # courses from course_entitlements.csv run at the same time by orchestrator.py
+    'ORCHESTRATOR_PROCESSES': lambda: int(os.getenv('ORCHESTRATOR_PROCESSES', 4)),
+    # page requests kept in flight per paginated Canvas list
+    'PAGINATION_MAX_IN_FLIGHT': lambda: int(os.getenv('PAGINATION_MAX_IN_FLIGHT', 4)),
+    # shared HTTP session for every Canvas object (see http_utils.py)
+    'HTTP_POOL_SIZE': lambda: int(os.getenv('HTTP_POOL_SIZE', 32)),
+    'HTTP_CONNECT_TIMEOUT': lambda: float(os.getenv('HTTP_CONNECT_TIMEOUT', 10)),
+    'HTTP_READ_TIMEOUT': lambda: float(os.getenv('HTTP_READ_TIMEOUT', 120)),
+    # New Analytics exports read at the same time by check_for_user_input_files
+    'NEWANALYTICS_READ_WORKERS': lambda: int(os.getenv('NEWANALYTICS_READ_WORKERS', 4)),
+    # smallest integer and categorical dtypes for the Module Progress tables (see data_utils.compact_dtypes)
+    'COMPACT_DTYPES': lambda: _flag('COMPACT_DTYPES', 'False'),
+    # course details transforms (and Tableau tables) run at the same time (see stage_scheduler.py)
+    'TRANSFORM_WORKERS': lambda: int(os.getenv('TRANSFORM_WORKERS', 4)),
+    # shared Canvas rate limiting (see rate_limiter.py)
+    'RATE_LIMIT_MAX_CONCURRENCY': lambda: int(os.getenv('RATE_LIMIT_MAX_CONCURRENCY', 16)),
+    'RATE_LIMIT_LOW_WATER': lambda: float(os.getenv('RATE_LIMIT_LOW_WATER', 300)),
+    'RATE_LIMIT_MAX_RETRIES': lambda: int(os.getenv('RATE_LIMIT_MAX_RETRIES', 5)),
+
+    # project structure folders
+    'DATA_FOLDER': _data_folder(),
+
+    # top-level folders (project and raw)
+    'PROJECT_FOLDER': _data_folder('/project_data'),
+    'RAW_FOLDER': _data_folder('/user_input'),
+    # Raw Data
+    #'NEWANALYTICS_FOLDER': _data_folder('/user_input/new_analytics_input'),
+    'NEWANALYTICS_NEW_FOLDER': _data_folder('/user_input/new_analytics_input'),
+    'GRADEBOOK_FOLDER': _data_folder('/user_input/gradebook_input'),
+
+    # Project Data
+    'ORIGINALDATA_FOLDER': _data_folder('/project_data/original_data'),
+    'APIOUTPUT_FOLDER': _data_folder('/project_data/original_data'),
+    'CLEANEDDATA_FOLDER': _data_folder('/project_data/cleaned_data'),
+
+    # memory for datasets kept between course details stages (see pipeline_context.py)
+    'PIPELINE_MEMORY_LIMIT_MB': lambda: float(os.getenv('PIPELINE_MEMORY_LIMIT_MB', 1024)),
+
+    # file format of original_data and cleaned_data datasets: parquet or csv (see storage.py)
+    'INTERMEDIATE_FORMAT': lambda: os.getenv('INTERMEDIATE_FORMAT', 'parquet').lower(),
+
+    # watermarks for incremental downloads (i.e. submissions changed since the last run)
+    'SYNC_STATE_FILE': _data_folder('/project_data/sync_state.json'),
+    'FULL_REFRESH': lambda: _flag('FULL_REFRESH', 'False'),
+    # days between full submission downloads, which pick up removed students and reset or deleted submissions
+    'SUBMISSIONS_FULL_REFRESH_DAYS': lambda: float(os.getenv('SUBMISSIONS_FULL_REFRESH_DAYS', 7)),
+
+    # fingerprints of each course details stage's last run, stages whose inputs are unchanged are skipped (see stage_cache.py)
+    'STAGE_MANIFEST_FILE': _data_folder('/stage_manifest.json'),
+    'FORCE_RERUN': lambda: _flag('FORCE_RERUN', 'False'),
+
+    # stages profiled every time they run, comma separated, e.g. get_student_module_status (see profiling.py)
+    'PROFILE_STAGES': lambda: [s.strip() for s in os.getenv('PROFILE_STAGES', '').split(',') if s.strip()],
+
+    # on-disk cache of Canvas API responses, revalidated with ETag / Last-Modified (opt-in: bodies hold student data)
+    'HTTP_CACHE_ENABLED': lambda: _flag('HTTP_CACHE', 'False'),
+    # data/all_courses/http_cache for runs over all courses (see orchestrator.py)
+    'HTTP_CACHE_FOLDER': _data_folder('/http_cache'),
+    'HTTP_CACHE_MAX_MB': lambda: int(os.getenv('HTTP_CACHE_MAX_MB', 500)),
+
+    'TABLEAU_FOLDER': _data_folder(),
+}
+
+
+def resolved():
+    """Returns {name: value} of the settings used or assigned so far"""
+    return {k: v for k, v in globals().items() if k in _SETTINGS}
 
-# top-level folders (project and raw)
-PROJECT_FOLDER = f'{DATA_FOLDER}/project_data'
-RAW_FOLDER = f'{DATA_FOLDER}/user_input'
-# Raw Data
 
-# Project Data
-ORIGINALDATA_FOLDER = f'{PROJECT_FOLDER}/original_data'
+def _get(name):
+    return globals()[name] if name in globals() else __getattr__(name)
 
-APIOUTPUT_FOLDER = f'{ORIGINALDATA_FOLDER}' 
 
-#NEWANALYTICS_FOLDER = f'{RAW_FOLDER}/new_analytics_input'
-NEWANALYTICS_NEW_FOLDER = f'{RAW_FOLDER}/new_analytics_input'
-GRADEBOOK_FOLDER = f'{RAW_FOLDER}/gradebook_input'
+def __getattr__(name):
+    try:
+        setting = _SETTINGS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    load_env()
+    value = setting()
+    globals()[name] = value
+    return value
 
-CLEANEDDATA_FOLDER = f'{PROJECT_FOLDER}/cleaned_data'
 
-TABLEAU_FOLDER = DATA_FOLDER
\ No newline at end of file
+def __dir__():
+    return sorted(set(globals()) | set(_SETTINGS))
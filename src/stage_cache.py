@@ -0,0 +1,202 @@
+"""
+Skips pipeline stages whose inputs have not changed since their last run.
+
+Every stage run through a StageCache gets a fingerprint of what it depends
+on: the content of its input files, its configuration, the source code of
+the pipeline (every .py file in src, since a stage's work is spread over
+helper modules) and, for Canvas downloads, the ETag/Last-Modified validators
+of the responses it was built from. The fingerprint and the
+outputs it produced are kept in a manifest, one per DATA_FOLDER
+(settings.STAGE_MANIFEST_FILE). When a stage comes round again with the same
+fingerprint and its outputs are still on disk untouched, it is skipped and
+the outputs of the previous run are used.
+
+File hashes are kept in the manifest too, keyed on size and modification
+time, so unchanged files are not read again to be hashed.
+"""
+
+import functools
+import glob
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .storage import find_dataset
+from .utils import print_line
+
+SOURCE_FOLDER = Path(__file__).resolve().parent
+
+
+@functools.cache
+def source_version():
+    """Returns a digest of every .py file in src (read once per process)"""
+    digest = hashlib.sha256()
+    for path in sorted(SOURCE_FOLDER.rglob("*.py")):
+        digest.update(f"{path.relative_to(SOURCE_FOLDER).as_posix()} ".encode())
+        digest.update(hashlib.sha256(path.read_bytes()).digest())
+    return digest.hexdigest()
+
+
+class StageCache:
+    """Manifest of stage fingerprints and outputs
+
+    Args:
+        manifest_path (str): JSON manifest, None runs every stage and records nothing
+        force (bool): run every stage even when its fingerprint is unchanged
+            (the manifest is still updated)
+    """
+
+    def __init__(self, manifest_path=None, force=False):
+        self.manifest_path = manifest_path
+        self.force = force
+        self.skipped = []
+        self._lock = threading.Lock()
+        self._manifest = _load_manifest(manifest_path) if manifest_path else {}
+        self._manifest.setdefault("stages", {})
+        self._manifest.setdefault("files", {})
+
+    @property
+    def enabled(self):
+        return self.manifest_path is not None
+
+    def run(self, stage, func, *args, inputs=(), outputs=(), config=None, **kwargs):
+        """Calls func(*args, **kwargs) unless stage is current
+
+        Args:
+            stage (str): unique name of the stage, e.g. "transform/assignments"
+            func (callable)
+            inputs (list): files, folders (every file in them) or
+                (folder, dataset name) pairs the stage reads
+            outputs (list): files or (folder, dataset name) pairs the stage writes
+            config (dict): settings the result depends on, must be JSON serializable
+
+        Returns:
+            what func returns, None when the stage is skipped
+        """
+        if not self.enabled:
+            return func(*args, **kwargs)
+        fingerprint = self.fingerprint(inputs, config)
+        if self.is_current(stage, fingerprint):
+            print_line(f"{stage}: inputs unchanged, keeping the previous outputs")
+            return None
+        result = func(*args, **kwargs)
+        self.record(stage, fingerprint, outputs)
+        return result
+
+    def fingerprint(self, inputs=(), config=None, validators=None):
+        """Returns a digest of the stage's inputs and the pipeline's code, None if they can't be fingerprinted
+
+        Args:
+            inputs (list): as for run
+            config (dict): as for run
+            validators (list of (url, validator)): HTTP responses the stage used,
+                see http_utils.collect_validators. An empty list, or a response
+                without a validator, can't be fingerprinted.
+
+        Returns:
+            str or None
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps(config or {}, sort_keys=True, default=str).encode())
+        digest.update(f"source {source_version()}".encode())
+        for path in self._input_files(inputs):
+            digest.update(f"{path} {self._file_hash(path)}".encode())
+        if validators is not None:
+            if not validators or any(v is None for _, v in validators):
+                return None
+            for url, validator in sorted(validators):
+                digest.update(f"{url} {validator}".encode())
+        return digest.hexdigest()
+
+    def is_current(self, stage, fingerprint):
+        """True when the stage last ran with this fingerprint and its outputs are unchanged"""
+        if not self.enabled or self.force or fingerprint is None:
+            return False
+        with self._lock:
+            entry = self._manifest["stages"].get(stage)
+        if entry is None or entry["fingerprint"] != fingerprint:
+            return False
+        current = all(_file_stat(path) == stat for path, stat in entry["outputs"].items())
+        if current:
+            with self._lock:
+                self.skipped.append(stage)
+        return current
+
+    def record(self, stage, fingerprint, outputs=()):
+        """Stores the fingerprint and outputs of a stage that just ran"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if fingerprint is None:
+                self._manifest["stages"].pop(stage, None)
+            else:
+                self._manifest["stages"][stage] = {
+                    "fingerprint": fingerprint,
+                    "outputs": {path: _file_stat(path) for path in self._output_files(outputs)},
+                    "completed_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                }
+            _save_manifest(self.manifest_path, self._manifest)
+
+    def _file_hash(self, path):
+        """sha256 of a file, reusing the manifest's hash if size and mtime are unchanged"""
+        stat = _file_stat(path)
+        if stat is None:
+            return "missing"
+        with self._lock:
+            known = self._manifest["files"].get(path)
+        if known and known[:2] == stat:
+            return known[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(2**20), b""):
+                digest.update(block)
+        with self._lock:
+            self._manifest["files"][path] = [*stat, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def _input_files(self, inputs):
+        files = []
+        for item in inputs:
+            if isinstance(item, tuple):
+                folder, name = item
+                files.append(find_dataset(folder, name) or f"{folder}/{name}")
+            elif os.path.isdir(item):
+                files += sorted(p for p in glob.glob(f"{item}/**", recursive=True) if os.path.isfile(p))
+            else:
+                files.append(str(item))
+        return files
+
+    def _output_files(self, outputs):
+        files = []
+        for item in outputs:
+            path = find_dataset(*item) if isinstance(item, tuple) else str(item)
+            if path is not None:
+                files.append(path)
+        return files
+
+
+def _file_stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(path, manifest):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,121 @@
+"""
+Runs pipeline steps on a thread pool in the order their dependencies allow.
+
+Each Stage names the stages it depends on. A stage is started as soon as
+every stage it depends on has finished, so independent stages (e.g. the
+seven transform_data calls) run at the same time. With max_workers=1 the
+stages run one at a time, in the order given.
+
+A stage that raises does not stop the others: stages that don't depend on
+it still run, the ones that do are not started. Every failure is printed as
+it happens and run_stages raises a StageError listing them once nothing is
+left to run.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .utils import print_unexpected
+
+
+class Stage:
+    """A step for run_stages: func(*args, **kwargs), run after the stages in depends_on
+
+    Args:
+        name (str): unique name, used for dependencies and reporting
+        func (callable)
+        args (tuple)
+        kwargs (dict)
+        depends_on (list of str): names of the stages that must finish first
+    """
+
+    def __init__(self, name, func, args=(), kwargs=None, depends_on=()):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.depends_on = list(depends_on)
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, depends_on={self.depends_on})"
+
+
+class StageError(Exception):
+    """One or more stages failed
+
+    Attributes:
+        errors (dict): stage name -> exception raised, or the StageError
+            for stages not started because a dependency failed
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        details = "; ".join(f"{name}: {error}" for name, error in errors.items())
+        super().__init__(f"{len(errors)} stage(s) failed: {details}")
+
+
+def run_stages(stages, max_workers=1):
+    """Runs stages concurrently, each once the stages it depends on have finished
+
+    Args:
+        stages (list of Stage)
+        max_workers (int): stages running at the same time
+
+    Returns:
+        dict: stage name -> what its func returned
+
+    Raises:
+        ValueError: unknown dependency, duplicate name or dependency cycle
+        StageError: a stage raised (after every other runnable stage finished)
+    """
+    pending = {}
+    for stage in stages:
+        if stage.name in pending:
+            raise ValueError(f"Duplicate stage name {stage.name}")
+        pending[stage.name] = stage
+    for stage in stages:
+        unknown = [dep for dep in stage.depends_on if dep not in pending]
+        if unknown:
+            raise ValueError(f"Stage {stage.name} depends on unknown stage(s) {unknown}")
+
+    results = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers or 1)) as executor:
+        running = {}
+        while pending or running:
+            _start_ready(pending, running, results, errors, executor)
+
+            if not running:
+                if pending:
+                    raise ValueError(f"Dependency cycle between stages {list(pending)}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    errors[name] = e
+                    print_unexpected(f"{name}: failed, {type(e).__name__}: {e}")
+
+    if errors:
+        raise StageError(errors)
+    return results
+
+
+def _start_ready(pending, running, results, errors, executor):
+    """Submits every pending stage whose dependencies finished, drops those whose dependencies failed"""
+    changed = True
+    while changed:
+        changed = False
+        for name, stage in list(pending.items()):
+            failed = [dep for dep in stage.depends_on if dep in errors]
+            if failed:
+                del pending[name]
+                errors[name] = StageError({dep: errors[dep] for dep in failed})
+                print_unexpected(f"{name}: not run, depends on failed stage(s) {', '.join(failed)}")
+                # stages listed earlier may depend on this one
+                changed = True
+            elif all(dep in results for dep in stage.depends_on):
+                del pending[name]
+                running[executor.submit(stage.func, *stage.args, **stage.kwargs)] = name
@@ -0,0 +1,202 @@
+"""
+Storage for the datasets handed between pipeline stages.
+
+original_data and cleaned_data are written as Parquet, which keeps dtypes
+(typed timestamps, nullable scores) and lets readers load only the columns
+they use. CSV is written when INTERMEDIATE_FORMAT=csv is set, or when
+pyarrow is not installed. Readers do not need to know which format was used:
+read_dataset picks whichever file exists, newest first.
+
+Tableau exports are not datasets; they stay plain CSV files.
+"""
+
+import os
+import warnings
+from pathlib import Path
+
+import pandas as pd
+
+from . import settings
+from .data_utils import CANVAS_DATETIME_FORMAT
+from .run_report import record_rows
+
+FORMATS = ("parquet", "csv")
+# object column contents (pandas.api.types.infer_dtype) Parquet stores as one type
+_PARQUET_INFERRED_TYPES = ("string", "empty", "boolean", "integer", "floating", "mixed-integer-float",
+                           "datetime", "date", "bytes")
+
+
+def write_dataset(dataframe, folder, name, fmt=None):
+    """Writes a dataset and removes any copy of it in the other format
+
+    Args:
+        dataframe (DataFrame)
+        folder (str): stage folder, e.g. settings.CLEANEDDATA_FOLDER
+        name (str): dataset name, without extension
+        fmt (str): "parquet" or "csv", defaults to settings.INTERMEDIATE_FORMAT
+
+    Returns:
+        str: path written
+    """
+    fmt = _resolve_format(fmt)
+    Path(folder).mkdir(parents=True, exist_ok=True)
+    path = dataset_path(folder, name, fmt)
+    dataframe = dataframe.reset_index(drop=True)
+
+    if fmt == "parquet":
+        _parquet_safe(dataframe).to_parquet(path, index=False)
+    else:
+        dataframe.to_csv(path, index=False, date_format=CANVAS_DATETIME_FORMAT)
+
+    _remove_other_formats(folder, name, fmt)
+    record_rows(len(dataframe))
+    return path
+
+
+class DatasetWriter:
+    """Writes a dataset one chunk at a time, so it never has to be in memory at once
+
+    The dataset is written to a temporary file and only replaces the
+    previous one when the writer is closed without an error. Every chunk
+    must have the same columns and dtypes as the first one.
+
+    Usage:
+        with DatasetWriter(folder, name) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+
+    Args:
+        folder (str)
+        name (str): dataset name, without extension
+        fmt (str): "parquet" or "csv", defaults to settings.INTERMEDIATE_FORMAT
+    """
+
+    def __init__(self, folder, name, fmt=None):
+        self.folder = folder
+        self.name = name
+        self.fmt = _resolve_format(fmt)
+        self.path = dataset_path(folder, name, self.fmt)
+        self.rows = 0
+        self._tmp_path = f"{self.path}.tmp"
+        self._parquet_writer = None
+        self._schema = None
+        self._started = False
+        Path(folder).mkdir(parents=True, exist_ok=True)
+
+    def write(self, dataframe):
+        dataframe = dataframe.reset_index(drop=True)
+        if self.fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(_parquet_safe(dataframe), schema=self._schema, preserve_index=False)
+            if self._parquet_writer is None:
+                self._schema = table.schema
+                self._parquet_writer = pq.ParquetWriter(self._tmp_path, self._schema)
+            self._parquet_writer.write_table(table)
+        else:
+            dataframe.to_csv(self._tmp_path, mode="a" if self._started else "w", header=not self._started,
+                             index=False, date_format=CANVAS_DATETIME_FORMAT)
+        self._started = True
+        self.rows += len(dataframe)
+        record_rows(len(dataframe))
+
+    def close(self):
+        """Finishes the dataset and returns its path (None if nothing was written)"""
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if not self._started:
+            return None
+        os.replace(self._tmp_path, self.path)
+        _remove_other_formats(self.folder, self.name, self.fmt)
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def read_dataset(folder, name, columns=None):
+    """Reads a dataset written by write_dataset (or a CSV from an older run)
+
+    Args:
+        folder (str)
+        name (str): dataset name, without extension
+        columns (list of str): only load these columns
+
+    Returns:
+        DataFrame
+
+    Raises:
+        FileNotFoundError: no dataset with that name in folder
+    """
+    path = find_dataset(folder, name)
+    if path is None:
+        raise FileNotFoundError(f"No dataset {name} in {folder}")
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns)
+
+    df = pd.read_csv(path, usecols=columns)
+    # older runs wrote the DataFrame index as an unnamed first column
+    return df.drop(columns=["Unnamed: 0"], errors="ignore")
+
+
+def find_dataset(folder, name):
+    """Returns the path of the dataset, or None if it does not exist"""
+    paths = [dataset_path(folder, name, fmt) for fmt in FORMATS]
+    paths = [p for p in paths if os.path.exists(p)]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+def dataset_path(folder, name, fmt):
+    return f"{folder}/{name}.{fmt}"
+
+
+def _remove_other_formats(folder, name, fmt):
+    for other in FORMATS:
+        if other != fmt and os.path.exists(dataset_path(folder, name, other)):
+            os.remove(dataset_path(folder, name, other))
+
+
+def _resolve_format(fmt):
+    fmt = (fmt or settings.INTERMEDIATE_FORMAT).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown dataset format {fmt}, expected one of {FORMATS}")
+    if fmt == "parquet" and not _has_pyarrow():
+        warnings.warn("pyarrow is not installed, writing CSV instead of Parquet")
+        return "csv"
+    return fmt
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _parquet_safe(dataframe):
+    """Stringifies object columns Parquet can't store as a single type
+
+    Nested values (lists, dicts, API objects) become the same text a CSV
+    would hold, and columns mixing scalar types are written as text.
+    """
+    converted = {}
+    for col in dataframe.columns[dataframe.dtypes == object]:
+        values = dataframe[col]
+        if pd.api.types.infer_dtype(values, skipna=True) not in _PARQUET_INFERRED_TYPES:
+            converted[col] = values.map(lambda v: v if _is_missing(v) else str(v))
+    return dataframe.assign(**converted) if converted else dataframe
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and value != value)
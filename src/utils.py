@@ -1,10 +1,19 @@
 import sys
+import threading
+
+_print_lock = threading.Lock()
+
+def print_line(msg):
+    """Prints msg and its newline in one write, so lines of stages running at the same time don't run together"""
+    with _print_lock:
+        sys.stdout.write(f"{msg}\n")
+        sys.stdout.flush()
 
 def print_success(msg):
-    print(f"\033[0;32m{msg}\033[0m")
+    print_line(f"\033[0;32m{msg}\033[0m")
 
 def print_unexpected(msg):
-    print(f"\033[0;31m{msg}\033[0m")
+    print_line(f"\033[0;31m{msg}\033[0m")
 
 def shut_down(msg):
     print(msg)
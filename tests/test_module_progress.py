@@ -0,0 +1,65 @@
+"""
+Module Progress (get_student_module_status) against the fake Canvas server.
+
+Run from the project folder: python3 -m pytest tests
+"""
+
+import os
+
+os.environ.setdefault("COURSE_ID", "1")
+
+import pandas as pd
+import pytest
+from canvasapi import Canvas
+
+from benchmarks.fake_canvas import FakeCanvas
+from src import canvas_helpers
+from src.canvas_helpers import get_student_module_status
+
+COURSE_ID = 101
+
+
+@pytest.fixture(scope="module")
+def server():
+    with FakeCanvas(courses=[COURSE_ID], students=60, modules=4, items=6) as server:
+        yield server
+
+
+@pytest.fixture
+def course(server):
+    return Canvas(server.url, "fake-token").get_course(COURSE_ID)
+
+
+def test_concurrent_students_match_sequential(course):
+    sequential = get_student_module_status(course, max_workers=1)
+    concurrent = get_student_module_status(course, max_workers=8)
+
+    assert len(sequential) == 60 * 4
+    pd.testing.assert_frame_equal(concurrent, sequential)
+
+
+def test_failed_student_cancels_queued_students(course, monkeypatch):
+    calls = []
+    get_student_modules = canvas_helpers._get_student_modules
+
+    def failing(course, row):
+        calls.append(row["id"])
+        if len(calls) == 1:
+            raise RuntimeError("rate limited")
+        return get_student_modules(course, row)
+
+    monkeypatch.setattr(canvas_helpers, "_get_student_modules", failing)
+    with pytest.raises(RuntimeError, match="rate limited"):
+        get_student_module_status(course, max_workers=2)
+    # the student that failed and at most the few in flight, not the 60 queued
+    assert len(calls) < 10
+
+
+def test_bulk_matches_per_student(course, server):
+    per_student = get_student_module_status(course, max_workers=4)
+    server.reset_counts()
+    bulk = get_student_module_status(course, max_workers=4, bulk=True)
+
+    # students without progress (every 5th on the fake server) are not requested one by one
+    assert server.request_counts()["modules"] < 60
+    pd.testing.assert_frame_equal(bulk, per_student)
@@ -0,0 +1,129 @@
+"""
+Concurrent pagination (pagination_utils) against plain PaginatedList iteration.
+
+Run from the project folder: python3 -m pytest tests
+"""
+
+import json
+import os
+from urllib.parse import parse_qs, urlsplit
+
+os.environ.setdefault("COURSE_ID", "1")
+
+import pytest
+import requests
+from canvasapi.canvas_object import CanvasObject
+from canvasapi.paginated_list import PaginatedList
+from canvasapi.requester import Requester
+
+from src.pagination_utils import fetch_all, fetch_all_nested, fetch_lists
+
+BASE_URL = "https://canvas.test"
+API_URL = BASE_URL + "/api/v1/"
+ITEMS = 23
+PER_PAGE = 5
+# Link header pages with a numbered last link, without one, with opaque bookmarks,
+# pages through a meta property, and Link headers that end before meta.pagination does
+STYLES = ["last", "next", "bookmark", "meta", "link_and_meta"]
+
+
+class FakePages(requests.adapters.BaseAdapter):
+    """Serves ITEMS elements per endpoint, PER_PAGE at a time, paginated in the given style"""
+
+    def __init__(self, style):
+        super().__init__()
+        self.style = style
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        path = url.path[len("/api/v1/"):]
+        page = int(parse_qs(url.query).get("page", ["1"])[0].removeprefix("bm:"))
+        self.requests.append((path, page))
+
+        pages = -(-ITEMS // PER_PAGE)
+        items = [{"id": i, "path": path} for i in range((page - 1) * PER_PAGE, min(page * PER_PAGE, ITEMS))]
+        if page > pages:
+            items = [{"id": -page, "path": path}]
+        bookmark = "bm:" if self.style == "bookmark" else ""
+        links = {"current": page, "first": 1}
+        if page < pages:
+            links["next"] = page + 1
+        if self.style == "last":
+            links["last"] = pages
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = request.url
+        response.request = request
+        response.encoding = "utf-8"
+        if self.style == "meta":
+            body = {"items": items, "meta": {"pagination": {"current": f"{API_URL}{path}?page={page}"}}}
+            if page < pages:
+                body["meta"]["pagination"]["next"] = f"{API_URL}{path}?page={page + 1}"
+        else:
+            response.headers["Link"] = ",".join(f'<{API_URL}{path}?page={bookmark}{number}&per_page={PER_PAGE}>; '
+                                                f'rel="{rel}"' for rel, number in links.items())
+            body = items
+            if self.style == "link_and_meta":
+                # PaginatedList ignores the meta property when there are Link headers
+                body = {"items": items, "meta": {"pagination": {}}}
+                if page == pages:
+                    body["meta"]["pagination"]["next"] = f"{API_URL}{path}?page={page + 1}"
+        response._content = json.dumps(body).encode()
+        return response
+
+    def close(self):
+        pass
+
+
+class Parent(CanvasObject):
+    def get_children(self):
+        return _paginated_list(self._requester, f"parents/{self.id}/children", self.root)
+
+
+def _paginated_list(requester, endpoint, root):
+    return PaginatedList(Parent, requester, "GET", endpoint, {"root": root}, _root=root, per_page=PER_PAGE)
+
+
+@pytest.fixture(params=STYLES)
+def requester(request):
+    requester = Requester(BASE_URL, "fake-token")
+    requester.pages = FakePages(request.param)
+    requester._session.mount(BASE_URL, requester.pages)
+    requester.root = "items" if request.param in ("meta", "link_and_meta") else None
+    return requester
+
+
+def _attributes(elements):
+    return [(e.id, e.path) for e in elements]
+
+
+def test_fetch_all_matches_iteration(requester):
+    expected = _attributes(_paginated_list(requester, "things", requester.root))
+    requests_made = len(requester.pages.requests)
+
+    fetched = _attributes(fetch_all(_paginated_list(requester, "things", requester.root)))
+
+    assert len(expected) == ITEMS
+    assert fetched == expected
+    # every page once, whether requested up front or one after the other
+    assert len(requester.pages.requests) == 2 * requests_made
+
+
+def test_fetch_lists_matches_iteration(requester):
+    endpoints = ["things", "others", "more"]
+    expected = [_attributes(_paginated_list(requester, e, requester.root)) for e in endpoints]
+
+    fetched = fetch_lists([_paginated_list(requester, e, requester.root) for e in endpoints], max_in_flight=2)
+
+    assert [_attributes(elements) for elements in fetched] == expected
+
+
+def test_fetch_all_nested_matches_iteration(requester):
+    expected = [_attributes(parent.get_children())
+                for parent in _paginated_list(requester, "parents", requester.root)]
+
+    fetched = _attributes(fetch_all_nested(_paginated_list(requester, "parents", requester.root), "get_children"))
+
+    assert fetched == [child for children in expected for child in children]
@@ -0,0 +1,114 @@
+"""
+Incremental submission syncs (sync_submissions) against a full download.
+
+Run from the project folder: python3 -m pytest tests
+"""
+
+import os
+
+os.environ.setdefault("COURSE_ID", "1")
+
+import pandas as pd
+import pytest
+
+from src import file_utils, settings
+from src.custom_steps import special_course_details
+from src.custom_steps.get_course_details_data import sync_submissions
+from src.pipeline_context import PipelineContext
+
+NAME = special_course_details.ASSIGNMENTSUBMISSIONS_DICT["name"]
+
+
+class FakeSubmission:
+    def __init__(self, attributes):
+        self._requester = object()
+        self.__dict__.update(attributes)
+
+
+class FakeCourse:
+    """Answers get_multiple_submissions(student_ids='all', ...) from submission dicts, filtered like Canvas"""
+
+    def __init__(self, submissions):
+        self.submissions = submissions
+
+    def get_multiple_submissions(self, student_ids, submitted_since=None, graded_since=None):
+        assert student_ids == "all"
+        rows = self.submissions
+        if submitted_since:
+            rows = [r for r in rows if r["submitted_at"] and r["submitted_at"] >= submitted_since]
+        if graded_since:
+            rows = [r for r in rows if r["graded_at"] and r["graded_at"] >= graded_since]
+        return [FakeSubmission(r) for r in rows]
+
+
+def _timestamp(ts):
+    return ts.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _submission(user_id, assignment_id, submitted_at=None, graded_at=None, score=None):
+    return {"id": user_id * 100 + assignment_id, "user_id": user_id, "assignment_id": assignment_id,
+            "submitted_at": submitted_at, "graded_at": graded_at, "score": score,
+            "workflow_state": "graded" if graded_at else "submitted" if submitted_at else "unsubmitted"}
+
+
+@pytest.fixture
+def course_folder(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "FULL_REFRESH", False, raising=False)
+    monkeypatch.setattr(settings, "SUBMISSIONS_FULL_REFRESH_DAYS", 7, raising=False)
+    monkeypatch.setattr(settings, "SYNC_STATE_FILE", str(tmp_path / "sync_state.json"), raising=False)
+    monkeypatch.setattr(settings, "STAGE_MANIFEST_FILE", str(tmp_path / "stage_manifest.json"), raising=False)
+    monkeypatch.setattr(special_course_details, "ASSIGNMENTS_DICT",
+                        {"name": "assignments", "df": pd.DataFrame({"id": [10, 11, 12]})})
+    # active and invited students only, as course.get_enrollments() returns them
+    monkeypatch.setattr(special_course_details, "ENROLLMENTS_DICT",
+                        {"name": "enrollments", "df": pd.DataFrame({"user_id": [1, 2]})})
+    return tmp_path
+
+
+def _sync(course, folder, full_refresh=False):
+    data_dict = sync_submissions(course, dict(special_course_details.ASSIGNMENTSUBMISSIONS_DICT), str(folder),
+                                 full_refresh=full_refresh, context=PipelineContext(memory_limit_mb=0))
+    assert data_dict["df"] is not None
+    return PipelineContext(memory_limit_mb=0).read(str(folder), NAME)
+
+
+def _sorted(df):
+    return df.sort_values("id").reset_index(drop=True)[sorted(df.columns)]
+
+
+def test_incremental_sync_matches_full_download(course_folder):
+    now = pd.Timestamp.now(tz="UTC")
+    before, after = _timestamp(now - pd.Timedelta(days=2)), _timestamp(now + pd.Timedelta(minutes=1))
+    submissions = [_submission(user_id, assignment_id, before, before, 5.0)
+                   for user_id in [1, 2, 3] for assignment_id in [10, 11, 12]]
+    submissions[4] = _submission(2, 11)
+    course = FakeCourse(submissions)
+    _sync(course, course_folder / "incremental")
+
+    # regraded, newly submitted, assignment 12 deleted; student 3 concluded (still in full downloads)
+    submissions[0] = _submission(1, 10, before, after, 9.0)
+    submissions[4] = _submission(2, 11, after)
+    course.submissions = [s for s in submissions if s["assignment_id"] != 12]
+    special_course_details.ASSIGNMENTS_DICT["df"] = pd.DataFrame({"id": [10, 11]})
+
+    incremental = _sync(course, course_folder / "incremental")
+    full = _sync(course, course_folder / "full", full_refresh=True)
+
+    assert set(incremental["user_id"]) == {1, 2, 3}
+    pd.testing.assert_frame_equal(_sorted(incremental), _sorted(full))
+
+
+def test_removed_students_dropped_by_periodic_full_download(course_folder):
+    before = _timestamp(pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=2))
+    course = FakeCourse([_submission(user_id, 10, before, before, 5.0) for user_id in [1, 2, 3]])
+    _sync(course, course_folder)
+    course.submissions = course.submissions[:2]
+
+    # changes only: a removed student's submissions are not reported as changed
+    assert set(_sync(course, course_folder)["user_id"]) == {1, 2, 3}
+
+    sync_state = file_utils.load_sync_state(settings.SYNC_STATE_FILE)
+    sync_state[f"{NAME}:full"] = _timestamp(pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=8))
+    file_utils.save_sync_state(settings.SYNC_STATE_FILE, sync_state)
+    assert set(_sync(course, course_folder)["user_id"]) == {1, 2}
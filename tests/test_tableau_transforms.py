@@ -0,0 +1,41 @@
+"""
+Tableau tables built by transform_course_data_for_tableau.
+
+Run from the project folder: python3 -m pytest tests
+"""
+
+import os
+
+os.environ.setdefault("COURSE_ID", "1")
+
+import pandas as pd
+
+from src import settings
+from src.custom_steps import transform_course_data_for_tableau as tableau
+from src.pipeline_context import PipelineContext
+
+CONTENT_NAMES = ["slides.pptx", "essay.docx", "grades.xlsx", "index.html", "notes.pdf", "data.csv",
+                 "Week 1 Overview", None, "photo.jpeg", "photo.JPG", "diagram.png", "logo.svg", "banner.webp"]
+IMAGES = ["photo.jpeg", "photo.JPG", "diagram.png", "logo.svg", "banner.webp"]
+
+
+def test_student_analytics_drops_images_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CLEANEDDATA_FOLDER", str(tmp_path / "cleaned_data"), raising=False)
+    monkeypatch.setattr(settings, "TABLEAU_FOLDER", str(tmp_path), raising=False)
+    context = PipelineContext(memory_limit_mb=100)
+    context.write(pd.DataFrame({
+        "user_id": [1, 2], "student": ["A", "B"], "user_role": ["StudentEnrollment"] * 2,
+        "gb_current_score": [90.0, 80.0], "gb_final_score": [90.0, 80.0],
+        "enrollment_type": ["StudentEnrollment"] * 2, "enrollment_state": ["active"] * 2,
+    }), settings.CLEANEDDATA_FOLDER, "enrollments")
+    context.write(pd.DataFrame({
+        "global_user_id": [user_id for user_id in [1, 2] for _ in CONTENT_NAMES],
+        "global_course_id": 101,
+        "content_name": CONTENT_NAMES * 2,
+    }), settings.CLEANEDDATA_FOLDER, "new_analytics_new")
+
+    student_analytics = tableau.combine_enrollment_and_new_analytics_new(context)
+
+    kept = [name for name in CONTENT_NAMES if name not in IMAGES]
+    assert student_analytics is not None
+    assert student_analytics["content_name"].tolist() == kept * 2